@@ -1,3 +1,4 @@
-from .ui import main
-
-main()
+if __name__ == '__main__':
+    # Spawned worker processes re-run this module; they shouldn't load Qt
+    from .ui import main
+    main()
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+
+class NodeCache:
+    # LRU bookkeeping for cached child lists of model items.
+    # The budget is a number of cached child nodes. When it's exceeded,
+    # on_over_budget is called; the owner should then call evict() at
+    # a safe point (not while Qt is walking the model).
+
+    def __init__(self, budget=None, on_over_budget=None):
+        self.budget = budget
+        self.on_over_budget = on_over_budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_lists = 0
+        self.evicted_nodes = 0
+        self._eviction_pending = False
+
+    def add(self, item, name, value):
+        self.misses += 1
+        self.entries[item, name] = len(value) + 1
+        self.size += len(value) + 1
+        if self.budget and self.size > self.budget and not self._eviction_pending:
+            self._eviction_pending = True
+            if self.on_over_budget:
+                self.on_over_budget()
+
+    def touch(self, item, name):
+        self.hits += 1
+        self.entries.move_to_end((item, name))
+
+    def evict(self, pinned=()):
+        # Drop least recently used lists until we're comfortably under
+        # budget. Items in `pinned` (and so their subtrees) are kept.
+        self._eviction_pending = False
+        if not self.budget:
+            return
+        target = self.budget * 9 // 10
+        for item, name in list(self.entries):
+            if self.size <= target:
+                break
+            if item in pinned or (item, name) not in self.entries:
+                continue
+            self._drop(item, name)
+        print('Node cache:', self.stats())
+
+    def _drop(self, item, name):
+        self.size -= self.entries.pop((item, name))
+        value = item.__dict__.pop(name, ())
+        # lazy child lists (see modelitems.LazyChildren) only hold some nodes
+        value = getattr(value, 'created', value)
+        self.evicted_lists += 1
+        self.evicted_nodes += len(value)
+        for child in value:
+            for child_name in list(vars(child)):
+                if (child, child_name) in self.entries:
+                    self._drop(child, child_name)
+
+    def stats(self):
+        return {
+            'budget': self.budget,
+            'size': self.size,
+            'lists': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicted_lists': self.evicted_lists,
+            'evicted_nodes': self.evicted_nodes,
+        }
+
+
+class cached_children:
+    # Like functools.cached_property, but registered with model.node_cache.
+    # The value can be evicted at any time and is recomputed on next access.
+
+    def __init__(self, func):
+        self.func = func
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        cache = obj.model.node_cache
+        try:
+            value = obj.__dict__[self.name]
+        except KeyError:
+            value = obj.__dict__[self.name] = self.func(obj)
+            cache.add(obj, self.name, value)
+        else:
+            cache.touch(obj, self.name)
+        return value
+
+    def __set__(self, obj, value):
+        raise AttributeError(f'{self.name} is computed')
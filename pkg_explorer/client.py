@@ -0,0 +1,199 @@
+import asyncio
+import argparse
+import itertools
+import json
+import random
+import socket
+import time
+
+from .consts import server_socket
+
+
+class ServerError(Exception):
+    pass
+
+
+class QueryClient:
+    # Synchronous client for QueryServer
+
+    def __init__(self, path=server_socket):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rwb')
+        self.ids = itertools.count()
+
+    def call(self, method, **params):
+        request = {'id': next(self.ids), 'method': method, 'params': params}
+        self.file.write(json.dumps(request).encode() + b'\n')
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if 'error' in response:
+            raise ServerError(response['error'])
+        return response['result']
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+class RemotePackage:
+    # Stands in for hawkey.Package; dependencies are fetched lazily
+
+    def __init__(self, client, record):
+        self._client = client
+        self._deps = None
+        self.nevra = record['nevra']
+        for name, value in record.items():
+            setattr(self, name, value)
+
+    def __str__(self):
+        return self.nevra
+
+    def __repr__(self):
+        return f'<RemotePackage {self.nevra}>'
+
+    def __eq__(self, other):
+        if isinstance(other, RemotePackage):
+            return self.nevra == other.nevra
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.nevra)
+
+    def _get_deps(self, field):
+        if self._deps is None:
+            self._deps = self._client.call('deps', nevra=self.nevra)
+        return self._deps[field]
+
+    requires = property(lambda self: self._get_deps('requires'))
+    provides = property(lambda self: self._get_deps('provides'))
+    recommends = property(lambda self: self._get_deps('recommends'))
+    suggests = property(lambda self: self._get_deps('suggests'))
+
+
+class RemoteQuery:
+    # Stands in for hawkey.Query; filters are evaluated on the server.
+    # Reldeps are sent as strings, which hawkey filters also accept.
+
+    def __init__(self, sack, steps=()):
+        self._sack = sack
+        self._steps = list(steps)
+        self._result = None
+
+    def filter(self, **kwargs):
+        kwargs = {
+            k: list(v) if isinstance(v, (list, tuple, set)) else v
+            for k, v in kwargs.items()
+        }
+        return RemoteQuery(self._sack, self._steps + [['filter', kwargs]])
+
+    def available(self):
+        return RemoteQuery(self._sack, self._steps + [['available']])
+
+    def __iter__(self):
+        if self._result is None:
+            self._result = self._sack._packages(
+                self._sack.client.call('query', steps=self._steps),
+            )
+        return iter(self._result)
+
+
+class RemoteSack:
+    def __init__(self, client):
+        self.client = client
+        self._known = {}
+
+    def _packages(self, records):
+        # Keep one RemotePackage per NEVRA, so deps are fetched only once
+        result = []
+        for record in records:
+            pkg = self._known.get(record['nevra'])
+            if pkg is None:
+                pkg = self._known[record['nevra']] = RemotePackage(self.client, record)
+            result.append(pkg)
+        return result
+
+    def query(self):
+        return RemoteQuery(self)
+
+    def resolve_subject(self, text):
+        return self._packages(self.client.call('subject', text=text))
+
+    def resolve_closure(self, subjects):
+        result = self.client.call('closure', subjects=subjects)
+        return self._packages(result['packages']), result['problems']
+
+
+class RemoteBase:
+    # Stands in for dnf.Base in PkgModel
+
+    def __init__(self, path=server_socket):
+        self.client = QueryClient(path)
+        self.sack = RemoteSack(self.client)
+
+    def close(self):
+        self.client.close()
+
+
+async def _load_client(path, names, rounds, latencies):
+    reader, writer = await asyncio.open_unix_connection(path, limit=2**24)
+    try:
+        for i in range(rounds):
+            request = {
+                'id': i,
+                'method': random.choice(['subject', 'query']),
+            }
+            name = random.choice(names)
+            if request['method'] == 'subject':
+                request['params'] = {'text': name}
+            else:
+                request['params'] = {'steps': [['filter', {'provides': name}]]}
+            start = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b'\n')
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if 'error' in response:
+                raise ServerError(response['error'])
+    finally:
+        writer.close()
+
+
+async def load_test(path=server_socket, clients=100, rounds=50, names=None):
+    # Without names, queries are spread over all package names in the
+    # sack, so most of them aren't answered from the server's cache
+    if not names:
+        client = QueryClient(path)
+        names = client.call('names')
+        client.close()
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _load_client(path, list(names), rounds, latencies)
+        for i in range(clients)
+    ))
+    total = time.perf_counter() - start
+    latencies.sort()
+    print(f'{len(latencies)} queries from {clients} clients in {total:.2f}s '
+          f'({len(latencies) / total:.0f}/s)')
+    for pct in 50, 90, 99:
+        latency = latencies[min(len(latencies) - 1, len(latencies) * pct // 100)]
+        print(f'  p{pct}: {latency * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='pkg_explorer.client')
+    parser.add_argument('--socket', default=server_socket)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('names', nargs='*',
+                        help='names to query (default: all packages)')
+    args = parser.parse_args()
+    asyncio.run(load_test(args.socket, args.clients, args.rounds, args.names))
+    client = QueryClient(args.socket)
+    print(client.call('stats'))
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import hawkey
+
+from .configs import default_arches
+from .sack import make_base, subject_query, spawn_executor
+from .client import RemoteBase
+
+
+def resolve_closure(sack, subjects, arches=default_arches):
+    # Everything that installing `subjects` (like `dnf install`) pulls in.
+    # Returns (packages, problems). If the subjects can't all be installed,
+    # the problems are reported and the packages are what
+    # `dnf install --skip-broken` would install.
+    if resolve := getattr(sack, 'resolve_closure', None):
+        return resolve(list(subjects))
+    queries = []
+    for text in subjects:
+        q = subject_query(sack, text).filter(arch=list(arches))
+        if list(q):
+            queries.append(q)
+
+    def run(optional):
+        goal = hawkey.Goal(sack)
+        for q in queries:
+            goal.install(select=hawkey.Selector(sack).set(pkg=q), optional=optional)
+        return goal, goal.run(ignore_weak_deps=True)
+
+    goal, ok = run(optional=False)
+    if ok:
+        return goal.list_installs(), []
+    problems = [str(p) for p in goal.problems]
+    goal, ok = run(optional=True)
+    return (goal.list_installs() if ok else []), problems
+
+
+# Resolving takes seconds for big workloads, so the UI does it in a
+# worker process with its own sack (or server connection)
+
+_base = None
+
+
+def _init_resolver(cachedir, server):
+    global _base
+    if server:
+        _base = RemoteBase(server)
+    else:
+        _base = make_base(cachedir, cacheonly=True)
+
+
+def resolve_nevras(subjects):
+    pkgs, problems = resolve_closure(_base.sack, subjects)
+    return [str(pkg) for pkg in pkgs], problems
+
+
+def start_resolver(cachedir, server=None):
+    return spawn_executor(1, initializer=_init_resolver, initargs=(cachedir, server))
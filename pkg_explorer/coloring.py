@@ -2,7 +2,7 @@ import enum
 
 from PySide2.QtCore import Qt
 
-from .modelitems import Label, Workload, UnwantedSubject, Subject, Package
+from .modelitems import Label, Workload, UnwantedSubject, Subject
 
 class Color(enum.Enum):
     RED = Qt.red
@@ -21,18 +21,19 @@ def is_active(model, item, cls):
     return isinstance(item, cls) and item.underlying_object == model.active_indexes.get(cls)
 
 def colorize(model):
+    # Yields (underlying object, color) pairs; the first color wins
     for item in model.labels_root.children:
         if is_active(model, item, Label):
-            yield item, Color.BLUE
+            yield item.underlying_object, Color.BLUE
         else:
-            yield item, Color.GRAY
+            yield item.underlying_object, Color.GRAY
     active_workload = None
     for item in sorted(
             model.sources_root.children,
             key=lambda wl: (
                 wl.color != Color.BLUE,
                 not getattr(wl, 'unwanted_packages', None),
-                len(wl.children) // 100,
+                len(wl.ungrouped_children) // 100,
             ),
         ):
         if is_active(model, item, Workload) or item.color == Color.BLUE:
@@ -47,12 +48,13 @@ def colorize_workload(wl, color=None):
         if item.color == Color.BLUE:
             break
     else:
-        yield wl, Color.GRAY
+        yield wl.underlying_object, Color.GRAY
         return
-    yield wl, color or Color.DARK_BLUE
-    for item in wl.children:
+    yield wl.underlying_object, color or Color.DARK_BLUE
+    # not wl.children, which depends on the display mode
+    for item in wl.packages + wl.unwanted_packages:
         if isinstance(item, UnwantedSubject):
-            yield item, Color.RED
+            yield item.underlying_object, Color.RED
         if isinstance(item, Subject):
             if isinstance(item, UnwantedSubject):
                 color = Color.RED
@@ -61,9 +63,179 @@ def colorize_workload(wl, color=None):
             yield from colorize_subject(item, color)
 
 def colorize_subject(subj, color):
-    yield subj, color
-    for item in subj.children:
-        yield item, color
-        if isinstance(item, Package) and color == Color.GREEN:
-            for src in item.sources:
-                yield src, item.color or color
+    # Packages rather than subj.children, so no items are created
+    model = subj.model
+    yield subj.underlying_object, color
+    for pkg in subj.pkgs:
+        yield pkg, color
+        if color == Color.GREEN:
+            for src in model.source_index.sources.get(pkg.source_name, ()):
+                yield src, model.package_color(pkg) or color
+
+
+# Bitset engine: packages get dense integer ids, and package sets
+# (subject contents, sources, everything of one color) are Python ints
+# used as bitsets. Membership bitsets are built once per sack; a recolor
+# then only does int operations per subject.
+# Gives the same result as colorize(); see tests/test_coloring.py.
+
+def to_bits(ids):
+    if not ids:
+        return 0
+    buf = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, 'little')
+
+
+class PackageIndex:
+    # Package ids and membership bitsets; lives as long as the sack
+
+    def __init__(self, source_index):
+        self.source_index = source_index
+        self.ids = {}
+        self.subjects = {}
+
+    def id(self, pkg):
+        try:
+            return self.ids[pkg]
+        except KeyError:
+            i = self.ids[pkg] = len(self.ids)
+            return i
+
+    def bits(self, pkgs):
+        return to_bits([self.id(p) for p in pkgs])
+
+    def subject(self, item):
+        # (bits of the subject's packages, [(pkg, bits of its sources)])
+        # The second list has the first package of each source, in order:
+        # that package decides the color of the source.
+        key = item.label, tuple(item.arches)
+        try:
+            return self.subjects[key]
+        except KeyError:
+            pkgs = item.pkgs
+            groups = {}
+            for pkg in pkgs:
+                if pkg.source_name in groups:
+                    continue
+                if srcs := self.source_index.sources.get(pkg.source_name):
+                    groups[pkg.source_name] = pkg, self.bits(srcs)
+            result = self.subjects[key] = self.bits(pkgs), list(groups.values())
+            return result
+
+
+class BitsetColors:
+    # Read-only stand-in for PkgModel.obj_colors: one bitset of package
+    # ids per color, and a dict for everything that isn't a package.
+    # Testing a bit is O(number of packages), so once coloring is done,
+    # finish() turns the bitsets into a table of color codes by id.
+
+    def __init__(self, index):
+        self.index = index
+        self.clear()
+
+    def claim(self, bits, color):
+        # First claim wins, like PkgModel._colorize
+        new = bits & ~self.claimed
+        self.claimed |= new
+        self.bits[color] |= new
+
+    def bit_color(self, pkg):
+        # Color of a package while the bitsets are being built
+        i = self.index.ids.get(pkg)
+        if i is None or not self.claimed >> i & 1:
+            return None
+        for color, bits in self.bits.items():
+            if bits >> i & 1:
+                return color
+
+    def finish(self):
+        size = len(self.index.ids)
+        table = 0
+        for code, bits in enumerate(self.bits.values(), 1):
+            # one byte per id: the color's code where its bit is set
+            digits = format(bits, 'b')[::-1].ljust(size, '0')
+            codes = digits.encode().translate(bytes.maketrans(b'01', bytes([0, code])))
+            table |= int.from_bytes(codes, 'little')
+        self.table = table.to_bytes(size, 'little')
+
+    def color(self, pkg):
+        i = self.index.ids.get(pkg)
+        if i is None or i >= len(self.table):
+            return None
+        return _COLORS[self.table[i]]
+
+    def get(self, obj, default=None):
+        if (color := self.color(obj)) is not None:
+            return color
+        return self.other.get(obj, default)
+
+    def __contains__(self, obj):
+        return self.get(obj) is not None
+
+    def clear(self):
+        self.bits = dict.fromkeys(Color, 0)
+        self.claimed = 0
+        self.table = b''
+        self.other = {}
+
+
+_COLORS = [None, *Color]
+
+
+def colorize_bitsets(model):
+    mods = model.mods_root.mods
+    colors = BitsetColors(model.package_index)
+    other = colors.other
+
+    def effective(item):
+        if mod := mods.get(item.key):
+            return mod.color
+        return other.get(item.underlying_object)
+
+    def pkg_color(pkg):
+        if mod := mods.get(('pkg', pkg.name)):
+            return mod.color
+        return colors.bit_color(pkg)
+
+    def claim(item, color):
+        other.setdefault(item.underlying_object, color)
+
+    for item in model.labels_root.children:
+        if is_active(model, item, Label):
+            claim(item, Color.BLUE)
+        else:
+            claim(item, Color.GRAY)
+
+    for wl in sorted(
+            model.sources_root.children,
+            key=lambda wl: (
+                effective(wl) != Color.BLUE,
+                not getattr(wl, 'unwanted_packages', None),
+                len(wl.ungrouped_children) // 100,
+            ),
+        ):
+        if not any(effective(lbl) == Color.BLUE for lbl in wl.labels):
+            claim(wl, Color.GRAY)
+            continue
+        if is_active(model, wl, Workload) or effective(wl) == Color.BLUE:
+            color = Color.BLUE
+        else:
+            color = None
+        claim(wl, color or Color.DARK_BLUE)
+        for item in wl.packages + wl.unwanted_packages:
+            if isinstance(item, UnwantedSubject):
+                color = Color.RED
+            else:
+                color = color or Color.GREEN
+            claim(item, color)
+            bits, sources = model.package_index.subject(item)
+            colors.claim(bits, color)
+            if color != Color.GREEN:
+                continue
+            for pkg, src_bits in sources:
+                colors.claim(src_bits, pkg_color(pkg) or color)
+
+    colors.finish()
+    return colors
@@ -0,0 +1,82 @@
+import json
+from pathlib import Path
+
+import yaml
+
+from .consts import the_arch, yaml_cacheir
+
+default_arches = (the_arch, 'noarch')
+
+
+def read_yaml(path):
+    stat = path.stat()
+    key = [stat.st_mtime, stat.st_size]
+    cache_file = Path(yaml_cacheir) / path.with_suffix('.jsonlines').name
+    if cache_file.exists():
+        with cache_file.open() as f:
+            key2 = json.loads(f.readline())
+            if key == key2:
+                return json.load(f)
+    if stat.st_size > 1024 * 100:
+        return {'$icon': 'weight-hanging'}
+    print('Reading', path)
+    with path.open() as f:
+        try:
+            data = yaml.safe_load(f)
+        except Exception as e:
+            print(e)
+            return {'$icon': 'bug'}
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    with cache_file.open('w') as f:
+        json.dump(key, f)
+        print(file=f)
+        json.dump(data, f)
+    return data
+
+
+def workload_packages(data):
+    return (
+        data.get('packages', [])
+        + data.get('arch_packages', {}).get(the_arch, [])
+        + list(data.get('package_placeholders', ()))
+    )
+
+
+def workload_subjects(root_path):
+    # {config file name: subjects} for workloads that list any packages
+    result = {}
+    for path in sorted(root_path.glob('*.yaml')):
+        if subjects := workload_packages(read_yaml(path).get('data', {})):
+            result[path.name] = subjects
+    return result
+
+
+def workload_unwanted_packages(data):
+    # (subject, arches) pairs
+    return [
+        (pkg, default_arches)
+        for pkg in (
+            data.get('unwanted_packages', [])
+            + data.get('unwanted_arch_packages', {}).get(the_arch, [])
+        )
+    ] + [
+        (pkg, ['src'])
+        for pkg in data.get('unwanted_source_packages', ())
+    ]
+
+
+def read_mods(path):
+    # {(kind, name): color name or None}
+    mods = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                continue
+            color, kind, name = line.split(' ', 2)
+            if color == 'None':
+                color = None
+            mods[kind, name] = color
+    return mods
@@ -2,3 +2,7 @@ cachedir = '_dnf_cache'
 yaml_cacheir = '_yaml_cache'
 releasever = 'rawhide'
 the_arch = 'x86_64'
+node_cache_budget = 200_000
+server_socket = 'pkg-explorer.sock'
+server_cache_size = 20_000
+fetch_page_size = 200
@@ -0,0 +1,248 @@
+import sys
+import json
+import argparse
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+from .consts import the_arch
+from .sack import subject_query
+
+
+def walk_graph(model, workloads, *, weak=False, max_depth=None):
+    # Yields ('node', id, attrs) and ('edge', source, target, attrs).
+    # A node is always yielded before any edge that refers to it.
+    # Only sets of package NEVRAs and the BFS queue are kept, so memory
+    # grows with the number of packages, not edges.
+    sack = model.base.sack
+    mods = model.mods_root.mods
+
+    def node_attrs(kind, label, key, obj):
+        attrs = {'kind': kind, 'label': label}
+        if mod := mods.get(key):
+            attrs['mod'] = mod.color.name if mod.color else 'none'
+            color = mod.color
+        else:
+            color = model.obj_colors.get(obj)
+        if color:
+            attrs['color'] = color.name
+        return attrs
+
+    @lru_cache(maxsize=8192)
+    def providers(reldep):
+        q = sack.query().filter(provides=reldep, arch=[the_arch, 'noarch'])
+        return list(q)
+
+    seen = set()
+    # A package seen only as unwanted isn't followed until something
+    # wanted reaches it
+    followed = set()
+    queue = deque()
+
+    def visit(pkg, depth, follow=True):
+        nevra = str(pkg)
+        if follow and nevra not in followed:
+            followed.add(nevra)
+            queue.append((pkg, depth))
+        if nevra not in seen:
+            seen.add(nevra)
+            attrs = node_attrs('package', pkg.name, ('pkg', pkg.name), pkg)
+            attrs['nevra'] = nevra
+            return ('node', 'pkg:' + nevra, attrs)
+
+    for wl in workloads:
+        wl_id = 'workload:' + wl.path.name
+        yield 'node', wl_id, node_attrs('workload', wl.label, wl.key, wl)
+        subjects = [(s, False) for s in wl.packages]
+        subjects += [(s, True) for s in wl.unwanted_packages]
+        for subj, unwanted in subjects:
+            subj_id = f'subj:{wl.path.name}:{subj.label}'
+            attrs = node_attrs('subject', subj.label, subj.key, subj.underlying_object)
+            if unwanted:
+                attrs['unwanted'] = True
+            yield 'node', subj_id, attrs
+            yield 'edge', wl_id, subj_id, {'kind': 'unwanted' if unwanted else 'wants'}
+            for pkg in subject_query(sack, subj.label):
+                if pkg.arch not in subj.arches:
+                    continue
+                # dependencies of unwanted packages aren't followed
+                if node := visit(pkg, 0, follow=not unwanted):
+                    yield node
+                yield 'edge', subj_id, 'pkg:' + str(pkg), {'kind': 'resolves'}
+
+    while queue:
+        pkg, depth = queue.popleft()
+        if max_depth is not None and depth >= max_depth:
+            continue
+        pkg_id = 'pkg:' + str(pkg)
+        targets = {}
+        reldeps = [(str(r), 'requires') for r in pkg.requires]
+        if weak:
+            reldeps += [(str(r), 'recommends') for r in pkg.recommends]
+        for reldep, kind in reldeps:
+            for provider in providers(reldep):
+                if provider == pkg:
+                    continue
+                targets.setdefault((provider, kind), []).append(reldep)
+        for (provider, kind), via in targets.items():
+            if node := visit(provider, depth + 1):
+                yield node
+            yield 'edge', pkg_id, 'pkg:' + str(provider), {
+                'kind': kind, 'label': '; '.join(via),
+            }
+
+
+class JsonLinesWriter:
+    def __init__(self, out):
+        self.out = out
+
+    def begin(self):
+        pass
+
+    def node(self, id, attrs):
+        print(json.dumps({'type': 'node', 'id': id, **attrs}), file=self.out)
+
+    def edge(self, source, target, attrs):
+        print(json.dumps({
+            'type': 'edge', 'source': source, 'target': target, **attrs,
+        }), file=self.out)
+
+    def end(self):
+        pass
+
+
+class DotWriter:
+    def __init__(self, out):
+        self.out = out
+
+    def begin(self):
+        print('digraph deps {', file=self.out)
+
+    def _attrs(self, attrs):
+        attrs = dict(attrs)
+        if color := attrs.pop('color', None):
+            attrs['color'] = attrs['fontcolor'] = color.lower().replace('_', '')
+        return ', '.join(f'{k}={self._quote(v)}' for k, v in attrs.items())
+
+    def _quote(self, value):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{value}"'
+
+    def node(self, id, attrs):
+        print(f'  {self._quote(id)} [{self._attrs(attrs)}];', file=self.out)
+
+    def edge(self, source, target, attrs):
+        print(
+            f'  {self._quote(source)} -> {self._quote(target)} [{self._attrs(attrs)}];',
+            file=self.out,
+        )
+
+    def end(self):
+        print('}', file=self.out)
+
+
+class GraphMLWriter:
+    node_keys = 'kind', 'label', 'nevra', 'color', 'mod', 'unwanted'
+    edge_keys = 'kind', 'label'
+
+    def __init__(self, out):
+        self.out = out
+
+    def begin(self):
+        print('<?xml version="1.0" encoding="UTF-8"?>', file=self.out)
+        print('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">', file=self.out)
+        for domain, keys in ('node', self.node_keys), ('edge', self.edge_keys):
+            for key in keys:
+                print(
+                    f'  <key id="{domain}_{key}" for="{domain}"'
+                    + f' attr.name="{key}" attr.type="string"/>',
+                    file=self.out,
+                )
+        print('  <graph edgedefault="directed">', file=self.out)
+
+    def _data(self, domain, attrs):
+        return ''.join(
+            f'<data key="{domain}_{k}">{escape(str(v))}</data>'
+            for k, v in attrs.items()
+        )
+
+    def node(self, id, attrs):
+        print(
+            f'    <node id={quoteattr(id)}>{self._data("node", attrs)}</node>',
+            file=self.out,
+        )
+
+    def edge(self, source, target, attrs):
+        print(
+            f'    <edge source={quoteattr(source)} target={quoteattr(target)}>'
+            + f'{self._data("edge", attrs)}</edge>',
+            file=self.out,
+        )
+
+    def end(self):
+        print('  </graph>', file=self.out)
+        print('</graphml>', file=self.out)
+
+
+writers = {
+    'jsonl': JsonLinesWriter,
+    'dot': DotWriter,
+    'graphml': GraphMLWriter,
+}
+
+
+def export_graph(model, workloads, out, format='jsonl', **walk_args):
+    writer = writers[format](out)
+    writer.begin()
+    for event, *args in walk_graph(model, workloads, **walk_args):
+        getattr(writer, event)(*args)
+    writer.end()
+
+
+def select_workloads(model, labels=(), names=()):
+    return [
+        wl for wl in model.sources_root.children
+        if wl.path.name in names
+        or any(lbl.label in labels for lbl in wl.labels)
+    ]
+
+
+def main():
+    from .ui import PkgModel
+
+    parser = argparse.ArgumentParser(prog='pkg_explorer.export')
+    parser.add_argument('-l', '--label', action='append', default=[],
+                        help='export workloads with this label (and color by it)')
+    parser.add_argument('-w', '--workload', action='append', default=[],
+                        help='export this workload (YAML file name)')
+    parser.add_argument('-f', '--format', choices=writers, default='jsonl')
+    parser.add_argument('-o', '--output', type=Path)
+    parser.add_argument('--weak', action='store_true',
+                        help='follow Recommends too')
+    parser.add_argument('--depth', type=int, help='max. requires depth')
+    parser.add_argument('--server', metavar='SOCKET',
+                        help='use a running pkg_explorer.server')
+    args = parser.parse_args()
+
+    model = PkgModel(
+        Path('content-resolver-input/configs'),
+        color_engine='bitset', node_cache_budget=0, server=args.server,
+    )
+    with model:
+        if args.label:
+            if args.label[0] not in model.labels:
+                parser.error(f'unknown label: {args.label[0]}')
+            model.set_active(model.labels[args.label[0]])
+        workloads = select_workloads(model, args.label, args.workload)
+        if args.output:
+            with args.output.open('w') as out:
+                export_graph(model, workloads, out, args.format,
+                             weak=args.weak, max_depth=args.depth)
+        else:
+            export_graph(model, workloads, sys.stdout, args.format,
+                         weak=args.weak, max_depth=args.depth)
+
+
+if __name__ == '__main__':
+    main()
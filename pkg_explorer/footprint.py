@@ -0,0 +1,40 @@
+class Footprint:
+    # Install and download size of a resolved closure, by package color.
+    # Colors are whatever color_of(pkg) returns; None means uncolored.
+    # With problems, the closure is partial (see resolve_closure).
+
+    def __init__(self, pkgs, color_of, problems=()):
+        self.pkgs = list(pkgs)
+        self.problems = list(problems)
+        self.by_name = {}
+        for pkg in self.pkgs:
+            self.by_name.setdefault(pkg.name, []).append(pkg)
+        self.installsize = sum(pkg.installsize for pkg in self.pkgs)
+        self.downloadsize = sum(pkg.downloadsize for pkg in self.pkgs)
+        self.recolor(color_of)
+
+    def _add(self, pkg, color, sign):
+        totals = self.totals.setdefault(color, [0, 0])
+        totals[0] += sign * pkg.installsize
+        totals[1] += sign * pkg.downloadsize
+
+    def recolor(self, color_of):
+        self.colors = {}
+        self.totals = {}
+        for pkg in self.pkgs:
+            color = self.colors[pkg] = color_of(pkg)
+            self._add(pkg, color, 1)
+
+    def update_name(self, name, color_of):
+        # Only packages called `name` may have changed color
+        for pkg in self.by_name.get(name, ()):
+            new = color_of(pkg)
+            old = self.colors[pkg]
+            if new != old:
+                self._add(pkg, old, -1)
+                self._add(pkg, new, 1)
+                self.colors[pkg] = new
+
+    def get(self, color):
+        # (installsize, downloadsize) of packages with the given color
+        return tuple(self.totals.get(color, (0, 0)))
@@ -0,0 +1,272 @@
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from pathlib import Path
+
+from .consts import cachedir
+from .configs import read_yaml, read_mods, default_arches
+from .configs import workload_packages, workload_unwanted_packages
+from .sack import make_base, QueryCache, subject_packages, what_provides
+from .closure import resolve_closure
+
+mods_source = 'mods.txt'
+
+
+def file_stamp(path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WorkloadInfo:
+    def __init__(self, path):
+        self.name = path.name
+        self.stamp = file_stamp(path)
+        data = read_yaml(path).get('data', {})
+        self.labels = frozenset(data.get('labels', ()))
+        self.wanted = tuple(workload_packages(data))
+        self.unwanted = tuple(
+            (text, tuple(arches))
+            for text, arches in workload_unwanted_packages(data)
+        )
+        # pkg -> (parent pkg, reldep), or (None, subject) for roots
+        self.closure = None
+        self.problems = []
+
+
+class Leak:
+    def __init__(self, kind, subject, defined_in, pkg, path):
+        self.kind = kind
+        self.subject = subject
+        self.defined_in = defined_in
+        self.pkg = pkg
+        self.path = path
+
+    def format_path(self):
+        subject, *steps = self.path
+        parts = [f'{subject!r}']
+        for reldep, pkg in steps:
+            if reldep is None:
+                parts.append(str(pkg))
+            else:
+                parts.append(f'({reldep}) {pkg}')
+        return ' → '.join(parts)
+
+    def as_dict(self):
+        subject, *steps = self.path
+        return {
+            'kind': self.kind,
+            'subject': self.subject,
+            'defined_in': self.defined_in,
+            'package': str(self.pkg),
+            'path': [subject] + [[reldep, str(pkg)] for reldep, pkg in steps],
+        }
+
+
+class LeakAnalysis:
+    # For each workload, finds unwanted packages (and packages built from
+    # unwanted sources) in its requires closure, with the shortest path.
+    #
+    # A workload is checked against the unwanted lists of all configs that
+    # share a label with it, plus packages/subjects colored red in mods.txt.
+    # The closure is what installing the workload would install (see
+    # closure.py), so alternative providers that wouldn't be picked don't
+    # count; paths are the shortest requires paths within it. The provider
+    # index and per-package edges are shared by all workloads.
+    # refresh() only redoes the work for changed files.
+
+    def __init__(self, sack, root_path, mods_path=mods_source):
+        self.queries = QueryCache(sack)
+        self.root_path = root_path
+        self.mods_path = Path(mods_path)
+        self.mods_stamp = None
+        self.mod_unwanted = ()
+        self.workloads = {}
+        self.results = {}
+        self._edges = {}
+
+    def _pkg_edges(self, pkg):
+        try:
+            return self._edges[pkg]
+        except KeyError:
+            edges = self._edges[pkg] = [
+                (str(reldep), provider)
+                for reldep in pkg.requires
+                for provider in self.queries.get(what_provides, reldep)
+                if provider != pkg
+            ]
+            return edges
+
+    def _resolve(self, text, arches=default_arches):
+        return [
+            p for p in self.queries.get(subject_packages, text)
+            if p.arch in arches
+        ]
+
+    def _closure(self, info):
+        installs, info.problems = resolve_closure(self.queries.sack, info.wanted)
+        installs = set(installs)
+        parents = {}
+        queue = deque()
+        for text in info.wanted:
+            for pkg in self._resolve(text):
+                if pkg in installs and pkg not in parents:
+                    parents[pkg] = None, text
+                    queue.append(pkg)
+        while queue:
+            pkg = queue.popleft()
+            for reldep, provider in self._pkg_edges(pkg):
+                if provider in installs and provider not in parents:
+                    parents[provider] = pkg, reldep
+                    queue.append(provider)
+        return parents
+
+    def _path(self, closure, pkg):
+        steps = []
+        while True:
+            parent, via = closure[pkg]
+            if parent is None:
+                steps.append((None, pkg))
+                steps.reverse()
+                return [via] + steps
+            steps.append((via, pkg))
+            pkg = parent
+
+    def _unwanted_for(self, info):
+        # (subject, arches, defined_in) for everything info must not pull in
+        result = [(text, default_arches, mods_source) for text in self.mod_unwanted]
+        for other in self.workloads.values():
+            if other is info or (other.labels & info.labels):
+                for text, arches in other.unwanted:
+                    result.append((text, arches, other.name))
+        return result
+
+    def _leaks(self, info):
+        closure = info.closure
+        by_source = {}
+        for pkg in closure:
+            if pkg.source_name:
+                by_source.setdefault(pkg.source_name, []).append(pkg)
+        leaks = []
+        for text, arches, defined_in in self._unwanted_for(info):
+            for pkg in self._resolve(text, arches):
+                if pkg.arch == 'src':
+                    for binary in by_source.get(pkg.name, ()):
+                        leaks.append(Leak(
+                            'source', text, defined_in, binary,
+                            self._path(closure, binary),
+                        ))
+                elif pkg in closure:
+                    leaks.append(Leak(
+                        'package', text, defined_in, pkg,
+                        self._path(closure, pkg),
+                    ))
+        leaks.sort(key=lambda leak: (len(leak.path), str(leak.pkg)))
+        return leaks
+
+    def refresh(self):
+        # Returns names of workloads whose results changed
+        unwanted_changed = False
+        new_closures = set()
+        seen = set()
+        for path in sorted(self.root_path.glob('*.yaml')):
+            seen.add(path.name)
+            old = self.workloads.get(path.name)
+            if old and old.stamp == file_stamp(path):
+                continue
+            info = self.workloads[path.name] = WorkloadInfo(path)
+            if old and old.wanted == info.wanted:
+                info.closure = old.closure
+                info.problems = old.problems
+            else:
+                new_closures.add(path.name)
+            if not old or (old.unwanted, old.labels) != (info.unwanted, info.labels):
+                unwanted_changed = True
+        for name in self.workloads.keys() - seen:
+            if self.workloads.pop(name).unwanted:
+                unwanted_changed = True
+            self.results.pop(name, None)
+
+        if self.mods_path.exists():
+            stamp = file_stamp(self.mods_path)
+            if stamp != self.mods_stamp:
+                self.mods_stamp = stamp
+                mod_unwanted = tuple(sorted(
+                    name
+                    for (kind, name), color in read_mods(self.mods_path).items()
+                    if color == 'RED' and kind in ('pkg', 'subj')
+                ))
+                if mod_unwanted != self.mod_unwanted:
+                    self.mod_unwanted = mod_unwanted
+                    unwanted_changed = True
+
+        if unwanted_changed:
+            todo = set(self.workloads)
+        else:
+            todo = new_closures
+        changed = set()
+        for name in sorted(todo):
+            info = self.workloads[name]
+            if not info.wanted:
+                if self.results.pop(name, None) is not None:
+                    changed.add(name)
+                continue
+            if info.closure is None:
+                info.closure = self._closure(info)
+            self.results[name] = self._leaks(info)
+            changed.add(name)
+        return changed
+
+
+def print_report(analysis, names, out=sys.stdout):
+    for name in sorted(names):
+        leaks = analysis.results.get(name)
+        if not leaks:
+            continue
+        print(f'{name}: {len(leaks)} unwanted', file=out)
+        if problems := analysis.workloads[name].problems:
+            print(f'  (partial closure: {"; ".join(problems)})', file=out)
+        for leak in leaks:
+            print(f'  {leak.pkg} ({leak.kind} {leak.subject!r}, '
+                  f'unwanted in {leak.defined_in})', file=out)
+            print(f'    {leak.format_path()}', file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='pkg_explorer.leaks')
+    parser.add_argument(
+        '--configs', type=Path, default=Path('content-resolver-input/configs'),
+    )
+    parser.add_argument('--json', action='store_true', help='print JSON')
+    parser.add_argument(
+        '--watch', metavar='SECONDS', type=float,
+        help='keep running; re-check changed configs and mods.txt periodically',
+    )
+    args = parser.parse_args()
+
+    base = make_base(cachedir)
+    try:
+        analysis = LeakAnalysis(base.sack, args.configs)
+        while True:
+            start = time.perf_counter()
+            changed = analysis.refresh()
+            if args.json:
+                json.dump({
+                    name: [leak.as_dict() for leak in analysis.results.get(name, ())]
+                    for name in sorted(changed)
+                }, sys.stdout, indent=2)
+                print()
+            else:
+                print_report(analysis, changed)
+            print(f'{len(changed)} workloads analyzed in '
+                  f'{time.perf_counter() - start:.2f}s', file=sys.stderr)
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    finally:
+        base.close()
+
+
+if __name__ == '__main__':
+    main()
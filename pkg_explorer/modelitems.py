@@ -1,48 +1,96 @@
+from collections import deque
+from collections.abc import Sequence
 from functools import cached_property
-import json
 import traceback
-from pathlib import Path
 
 from PySide2.QtCore import Qt
 from PySide2.QtGui import QBrush, QColor
 
 import dnf
-import yaml
 
-from .consts import the_arch, yaml_cacheir
+from .consts import the_arch, fetch_page_size
+from .configs import read_yaml, workload_packages, workload_unwanted_packages
+from .sack import subject_packages
+from .sack import what_provides, what_requires
+from .repodiff import diff_snapshots, diff_closures
 from .util import get_icon
+from .cache import cached_children
 
 AutoexpandRole = Qt.UserRole + 1
 ColorRole = Qt.UserRole + 2
 
-def read_yaml(path):
-    stat = path.stat()
-    key = [stat.st_mtime, stat.st_size]
-    cache_file = Path(yaml_cacheir) / path.with_suffix('.jsonlines').name
-    if cache_file.exists():
-        with cache_file.open() as f:
-            key2 = json.loads(f.readline())
-            if key == key2:
-                return json.load(f)
-    if stat.st_size > 1024 * 100:
-        return {'$icon': 'weight-hanging'}
-    print('Reading', path)
-    with path.open() as f:
-        try:
-            data = yaml.safe_load(f)
-        except Exception as e:
-            print(e)
-            return {'$icon': 'bug'}
-    cache_file.parent.mkdir(parents=True, exist_ok=True)
-    with cache_file.open('w') as f:
-        json.dump(key, f)
-        print(file=f)
-        json.dump(data, f)
-    return data
+class LazyChildren(Sequence):
+    # Child list that creates each node on first access
+
+    def __init__(self, objs, factory):
+        self.objs = objs
+        self.factory = factory
+        self.nodes = [None] * len(objs)
+
+    def __len__(self):
+        return len(self.objs)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        node = self.nodes[row]
+        if node is None:
+            node = self.nodes[row] = self.factory(self.objs[row])
+        return node
+
+    def __contains__(self, item):
+        return any(node is item for node in self.nodes)
+
+    def index(self, item, *args):
+        # Only created nodes can be looked for
+        for row, node in enumerate(self.nodes):
+            if node is item:
+                return row
+        raise ValueError(item)
+
+    @property
+    def created(self):
+        return [node for node in self.nodes if node is not None]
+
+
+class ChainedChildren(Sequence):
+    # Concatenated child lists. Rows are looked up in the parts without
+    # iterating them, so LazyChildren parts only create the rows asked for.
+
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        for part in self.parts:
+            if 0 <= row < len(part):
+                return part[row]
+            row -= len(part)
+        raise IndexError(row)
+
+    def __contains__(self, item):
+        return any(item in part for part in self.parts)
+
+    def index(self, item, *args):
+        offset = 0
+        for part in self.parts:
+            try:
+                return offset + part.index(item)
+            except ValueError:
+                offset += len(part)
+        raise ValueError(item)
+
 
 class ModelItem:
     label = '???'
     col_count = 1
+    fetched_rows = fetch_page_size
     icon_name = None
     children = ()
     autoexpand = False
@@ -91,6 +139,9 @@ class ModelItem:
     def get_child(self, row, column):
         return self.children[row]
 
+    def column_data(self, column, role=Qt.DisplayRole):
+        return None
+
     @property
     def row_count(self):
         return len(self.children)
@@ -164,24 +215,14 @@ class Workload(ModelItem):
     def packages(self):
         return [
             Subject(pkg, parent=self)
-            for pkg in (
-                self.yaml_data_data.get('packages', [])
-                + self.yaml_data_data.get('arch_packages', {}).get(the_arch, [])
-                + list(self.yaml_data_data.get('package_placeholders', ()))
-            )
+            for pkg in self.subjects
         ]
 
     @cached_property
     def unwanted_packages(self):
         return [
-            UnwantedSubject(pkg, parent=self)
-            for pkg in (
-                self.yaml_data_data.get('unwanted_packages', [])
-                + self.yaml_data_data.get('unwanted_arch_packages', {}).get(the_arch, [])
-            )
-        ] + [
-            UnwantedSubject(pkg, arches=['src'], parent=self)
-            for pkg in (self.yaml_data_data.get('unwanted_source_packages', ()))
+            UnwantedSubject(pkg, arches=arches, parent=self)
+            for pkg, arches in workload_unwanted_packages(self.yaml_data_data)
         ]
 
     @cached_property
@@ -191,9 +232,32 @@ class Workload(ModelItem):
             for lbl in self.yaml_data_data.get('labels', ())
         ]
 
+    @cached_property
+    def subjects(self):
+        return workload_packages(self.yaml_data_data)
+
+    def column_data(self, column, role=Qt.DisplayRole):
+        return self.model.footprint_data(self, column, role)
+
+    @cached_property
+    def ungrouped_children(self):
+        return self.labels + self.packages + self.unwanted_packages
+
+    @cached_children
+    def grouped_children(self):
+        pkgs = {
+            pkg: None
+            for subject in self.packages
+            for pkg in subject.pkgs
+        }
+        grouped = source_groups(list(pkgs), parent=self)
+        return self.labels + grouped + self.unwanted_packages
+
     @property
     def children(self):
-        return self.labels + self.packages + self.unwanted_packages
+        if self.model.group_by_source:
+            return self.grouped_children
+        return self.ungrouped_children
 
 
 class Label(ModelItem):
@@ -231,82 +295,84 @@ class Package(ModelItem):
             epoch_part = ''
         return f'{pkg.name}–{epoch_part}{pkg.version}–{pkg.release}.{pkg.arch}'
 
-    @cached_property
+    @cached_children
     def sources(self):
         if self.pkg.source_name:
-            q = self.model.base.sack.query().filter(name=self.pkg.source_name, arch='src')
+            q = self.model.source_index.sources.get(self.pkg.source_name, ())
             return [type(self)(pkg, parent=self) for pkg in q]
         return []
 
-    @cached_property
+    @cached_children
     def reqs(self):
         reqs = sorted((Requirement(r, parent=self) for r in self.pkg.requires), key=lambda r: r.label)
         reqs += [WeakReq(r, parent=self) for r in self.pkg.recommends]
         reqs += [WeakReq(r, parent=self) for r in self.pkg.suggests]
         return reqs
 
-    @cached_property
+    @cached_children
     def provides(self):
         if self.pkg.arch == 'src':
-            result = []
-            for reldep in self.pkg.provides:
-                q = self.model.base.sack.query().filter(provides=reldep, arch=(the_arch, 'noarch'))
-                result.extend(q)
-            return sorted((
-                Package(r, icon_name='archive', label_prefix='→ ', parent=self)
-                for r in result
-            ), key=lambda r: r.label)
+            result = self.model.source_index.binaries_of(self.pkg.name)
+            return LazyChildren(
+                sorted(result, key=lambda p: p.name),
+                lambda p: Package(p, icon_name='archive', label_prefix='→ ', parent=self),
+            )
         else:
             return sorted((Provide(r, parent=self) for r in self.pkg.provides), key=lambda r: r.label)
 
-    @cached_property
+    @cached_children
     def collapsed_reqs(self):
         collapsed = []
         rest = []
         collapsed_pkgs = set()
         for req in self.reqs:
-            if len(req.pkgs) == 1 and req.strong:
-                [pkg] = req.pkgs
-                if pkg.pkg not in collapsed_pkgs:
-                    collapsed.append(type(self)(pkg.pkg, parent=self))
-                    collapsed_pkgs.add(pkg.pkg)
+            if len(req.providers) == 1 and req.strong:
+                [pkg] = req.providers
+                if pkg not in collapsed_pkgs:
+                    collapsed.append(type(self)(pkg, parent=self))
+                    collapsed_pkgs.add(pkg)
             else:
                 rest.append(req)
         return sorted(collapsed, key=lambda r: r.label) + rest
 
-    @cached_property
+    @cached_children
     def collapsed_provides(self):
         if self.pkg.arch == 'src':
             return self.provides
         if self.provides:
             pkgs = sorted(set(
-                p.pkg
+                p
                 for prov in self.provides
-                for p in prov.pkgs
-                if p.pkg != self.pkg
+                for p in prov.providers
+                if p != self.pkg
             ), key=lambda p: p.name)
             if pkgs:
                 return [CollapsedProvides(pkgs, parent=self)]
         return []
 
+    @cached_children
+    def grouped_collapsed_reqs(self):
+        pkgs = [r.pkg for r in self.collapsed_reqs if isinstance(r, Package)]
+        rest = [r for r in self.collapsed_reqs if not isinstance(r, Package)]
+        return source_groups(pkgs, parent=self) + rest
+
     @property
     def has_children(self):
         return self.sources or self.reqs or self.provides
 
     @property
     def children(self):
-        result = []
-        if self.sources:
-            result.extend(self.sources)
-        if self.model.collapse_reqs:
-            result.extend(self.collapsed_reqs)
+        if self.model.collapse_reqs and self.model.group_by_source:
+            reqs = self.grouped_collapsed_reqs
+        elif self.model.collapse_reqs:
+            reqs = self.collapsed_reqs
         else:
-            result.extend(self.reqs)
+            reqs = self.reqs
         if self.model.collapse_provides:
-            result.extend(self.collapsed_provides)
+            provides = self.collapsed_provides
         else:
-            result.extend(self.provides)
-        return result
+            provides = self.provides
+        return ChainedChildren(self.sources, reqs, provides)
 
     @property
     def key(self):
@@ -322,9 +388,54 @@ class CollapsedProvides(ModelItem):
         self.pkgs = pkgs
         self.label = f'Dependent packages ({len(pkgs)})'
 
-    @cached_property
+    @cached_children
+    def ungrouped_children(self):
+        return LazyChildren(self.pkgs, lambda p: Package(p, parent=self))
+
+    @cached_children
+    def grouped_children(self):
+        return source_groups(self.pkgs, parent=self)
+
+    @property
     def children(self):
-        return [Package(p, parent=self) for p in self.pkgs]
+        if self.model.group_by_source:
+            return self.grouped_children
+        return self.ungrouped_children
+
+
+class SourceGroup(ModelItem):
+    icon_name = 'wrench'
+
+    def __init__(self, source_name, pkgs, *, parent):
+        srcs = parent.model.source_index.sources.get(source_name)
+        if srcs:
+            # share colors with the src package
+            underlying_object = srcs[0]
+        else:
+            underlying_object = 'source', source_name
+        super().__init__(underlying_object, parent=parent)
+        self.label = f'{source_name} ({len(pkgs)})'
+        self.key = 'pkg', source_name
+        self.pkgs = pkgs
+
+    @cached_children
+    def children(self):
+        return LazyChildren(self.pkgs, lambda p: Package(p, parent=self))
+
+
+def source_groups(pkgs, *, parent):
+    # Packages built from the same source go under one SourceGroup;
+    # packages that are alone in their source stay as they are
+    by_source = {}
+    for pkg in pkgs:
+        by_source.setdefault(pkg.source_name or pkg.name, []).append(pkg)
+    result = []
+    for source_name, members in by_source.items():
+        if len(members) == 1:
+            result.append(Package(members[0], parent=parent))
+        else:
+            result.append(SourceGroup(source_name, members, parent=parent))
+    return sorted(result, key=lambda r: r.label)
 
 class Subject(ModelItem):
     icon_name = 'list-alt'
@@ -338,14 +449,14 @@ class Subject(ModelItem):
         self.arches = arches
         super().__init__(self.subject, parent=parent)
 
-    @cached_property
+    @property
+    def pkgs(self):
+        q = self.model.queries.get(subject_packages, self.label)
+        return [p for p in q if p.arch in self.arches]
+
+    @cached_children
     def children(self):
-        q = self.subject.get_best_query(self.model.base.sack)
-        return [
-            self._pkg_class(p, parent=self)
-            for p in q
-            if p.arch in self.arches
-        ]
+        return LazyChildren(self.pkgs, lambda p: self._pkg_class(p, parent=self))
 
 
 class UnwantedSubject(Subject):
@@ -364,13 +475,13 @@ class Requirement(ModelItem):
         self.key = self.key_category, str(reldep)
         self.reldep = reldep
 
-    @cached_property
+    @property
+    def providers(self):
+        return self.model.queries.get(what_provides, self.reldep)
+
+    @cached_children
     def pkgs(self):
-        result = []
-        q = self.model.base.sack.query()
-        q = q.available()
-        q = q.filter(provides=self.reldep, arch=[the_arch, 'noarch'])
-        return [Package(pkg, parent=self) for pkg in q]
+        return LazyChildren(self.providers, lambda p: Package(p, parent=self))
 
     @property
     def children(self):
@@ -386,13 +497,10 @@ class Provide(Requirement):
     icon_name = 'hand-holding'
     key_category = 'prov'
 
-    @cached_property
-    def pkgs(self):
-        result = []
-        q = self.model.base.sack.query()
-        q = q.available()
-        q = q.filter(requires=self.reldep, arch=[the_arch, 'noarch', 'src'])
-        return [Package(pkg, parent=self) for pkg in q]
+    @property
+    def providers(self):
+        # for a Provide, these are the packages that require it
+        return self.model.queries.get(what_requires, self.reldep)
 
 
 class Mods(ModelItem):
@@ -401,10 +509,16 @@ class Mods(ModelItem):
     def __init__(self, *, model):
         super().__init__(('mods',),model=model)
         self.mods = {}
+        self.children = []
 
-    @property
-    def children(self):
-        return list(self.mods.values())
+    def add(self, key, color):
+        mod = Mod(key, color, parent=self)
+        if old := self.mods.get(key):
+            self.children[self.children.index(old)] = mod
+        else:
+            self.children.append(mod)
+        self.mods[key] = mod
+        return mod
 
 class Mod(ModelItem):
     color = None
@@ -421,3 +535,155 @@ class Mod(ModelItem):
             return 'paintbrush'
         else:
             return 'eraser'
+
+
+class RepoDiff(ModelItem):
+    label = 'Repo diff'
+    icon_name = 'list-alt'
+
+    def __init__(self, old_cachedir, new_cachedir, futures, *, model):
+        super().__init__(('diff',), model=model)
+        self.label = f'Diff: {old_cachedir} → {new_cachedir}'
+        snapshot_futures, closure_futures = futures
+        # (futures, method to show their results), in order
+        self.stages = deque([
+            (snapshot_futures, self._show_packages),
+            (closure_futures, self._show_closures),
+        ])
+        self.snapshots = None
+        self.children = [DiffMessage('Loading snapshots…', 'question', parent=self)]
+
+    @property
+    def ready(self):
+        return bool(self.stages) and all(f.done() for f in self.stages[0][0])
+
+    def advance(self):
+        # Replaces the last ("Loading…") row with the next stage's results.
+        # Call only when ready, and in model.changing_layout().
+        futures, show = self.stages.popleft()
+        try:
+            results = [f.result() for f in futures]
+        except Exception as e:
+            self.stages.clear()
+            self.children = self.children[:-1] + [
+                DiffMessage(f'Failed: {type(e).__name__}: {e}', 'bug', parent=self),
+            ]
+        else:
+            show(*results)
+
+    def _current(self, names):
+        # Packages of the loaded sack, by NEVRA
+        return {
+            str(pkg): pkg
+            for pkg in self.model.base.sack.query().filter(name=sorted(names))
+        }
+
+    def _show_packages(self, old, new):
+        self.snapshots = old, new
+        added, removed, changed = diff_snapshots(old, new)
+        names = {name for name, arch in added} | {key[0] for key, *rest in changed}
+        current = self._current(names)
+        self.children = [
+            DiffGroup('Added', 'plus', [
+                (current.get(new[key][0]), new[key][0], '') for key in added
+            ], parent=self),
+            DiffGroup('Removed', 'eraser', [
+                (None, old[key][0], '') for key in removed
+            ], parent=self),
+            DiffGroup('Changed', 'screwdriver', [
+                (current.get(new_nevra), new_nevra, f'{old_nevra} ({", ".join(aspects)})')
+                for key, old_nevra, new_nevra, aspects in changed
+            ], parent=self),
+            DiffMessage('Resolving workload closures…', 'question', parent=self),
+        ]
+
+    def _show_closures(self, old, new):
+        diffs = diff_closures(old, new)
+        current = self._current(
+            name
+            for wl_name, added, removed, problems in diffs
+            for name, arch in added
+        )
+        self.children = self.children[:-1] + [
+            ClosureDiff(diffs, old, new, current, parent=self),
+        ]
+
+
+class ClosureDiff(ModelItem):
+    icon_name = 'toolbox'
+
+    def __init__(self, diffs, old, new, current, *, parent):
+        super().__init__((parent.underlying_object, 'closures'), parent=parent)
+        self.label = f'Workload closures ({len(diffs)})'
+        self.children = []
+        for wl_name, added, removed, problems in diffs:
+            old_keys, new_keys = old[wl_name][0], new[wl_name][0]
+            if problems:
+                self.children.append(DiffMessage(
+                    f'{wl_name}: {"; ".join(problems)}', 'bug', parent=self,
+                ))
+            if added or removed:
+                self.children.append(DiffGroup(wl_name, 'toolbox', [
+                    (current.get(new_keys[key]), new_keys[key], 'new in closure')
+                    for key in added
+                ] + [
+                    (None, old_keys[key], 'dropped from closure')
+                    for key in removed
+                ], parent=self))
+
+
+class DiffGroup(ModelItem):
+    def __init__(self, title, icon_name, entries, *, parent):
+        super().__init__((parent.underlying_object, title), parent=parent)
+        self.label = f'{title} ({len(entries)})'
+        self.icon_name = icon_name
+        self.entries = entries
+
+    @cached_property
+    def children(self):
+        return [
+            DiffPackage(pkg, note, parent=self)
+            if pkg is not None
+            else DiffEntry(nevra, note, parent=self)
+            for pkg, nevra, note in self.entries
+        ]
+
+
+class DiffPackage(Package):
+    # Package builds its children with type(self)(pkg, parent=...)
+    def __init__(self, pkg, note='', *, parent):
+        super().__init__(pkg, parent=parent)
+        self.note = note
+
+    @property
+    def extended_label(self):
+        if self.note:
+            return f'{super().extended_label} ← {self.note}'
+        return super().extended_label
+
+
+class DiffMessage(ModelItem):
+    def __init__(self, text, icon_name, *, parent):
+        super().__init__(('diff-message', text), parent=parent)
+        self.label = text
+        self.icon_name = icon_name
+
+
+class DiffEntry(ModelItem):
+    icon_name = 'archive'
+
+    def __init__(self, nevra, note, *, parent):
+        super().__init__(('diff-entry', nevra), parent=parent)
+        self.label = nevra
+        self.note = note
+
+    @property
+    def key(self):
+        name = self.label.rsplit('-', 2)[0]
+        return 'pkg', name
+
+    @property
+    def extended_label(self):
+        if self.note:
+            return f'{self.label} ← {self.note}'
+        return self.label
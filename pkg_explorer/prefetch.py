@@ -0,0 +1,58 @@
+import itertools
+from collections import deque
+
+from .sack import make_base, QueryCache
+from .sack import subject_packages
+from .sack import what_provides, what_requires
+
+
+def package_queries(pkg):
+    # The (func, arg) queries that expanding a Package item would run
+    for reldep in itertools.chain(pkg.requires, pkg.recommends, pkg.suggests):
+        yield what_provides, reldep
+    # sources and binaries of a src package come from the SourceIndex
+    if pkg.arch != 'src':
+        for reldep in pkg.provides:
+            yield what_requires, reldep
+
+
+def prefetch_package(queries, pkg, results):
+    for func, arg in package_queries(pkg):
+        results[func.__name__, str(arg)] = [str(p) for p in queries.get(func, arg)]
+
+
+def prefetch_worker(conn, cachedir, cache_budget=None):
+    # Runs in a separate process with its own sack.
+    # Receives (generation, [(kind, arg), ...]); each message replaces
+    # whatever is still pending from the previous one. The UI only asks
+    # for what its query cache doesn't have, so nothing is tracked here.
+    # Sends (generation, kind, arg, {(query name, arg): [nevra, ...]}).
+    base = make_base(cachedir, cacheonly=True)
+    try:
+        queries = QueryCache(base.sack, cache_budget)
+        by_nevra = {str(p): p for p in base.sack.query()}
+        pending = deque()
+        generation = None
+        while True:
+            while not pending or conn.poll():
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    return
+                if message is None:
+                    return
+                generation, wanted = message
+                pending = deque(wanted)
+            kind, arg = pending.popleft()
+            results = {}
+            if kind == 'pkg':
+                if pkg := by_nevra.get(arg):
+                    prefetch_package(queries, pkg, results)
+            elif kind == 'subject':
+                pkgs = queries.get(subject_packages, arg)
+                results['subject_packages', arg] = [str(p) for p in pkgs]
+                for pkg in pkgs:
+                    prefetch_package(queries, pkg, results)
+            conn.send((generation, kind, arg, results))
+    finally:
+        base.close()
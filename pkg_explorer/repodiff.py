@@ -0,0 +1,85 @@
+from hashlib import blake2b
+
+from .sack import make_base, spawn_executor
+from .closure import resolve_closure
+
+
+def reldeps_digest(reldeps):
+    h = blake2b(digest_size=8)
+    for reldep in sorted(str(r) for r in reldeps):
+        h.update(reldep.encode())
+        h.update(b'\0')
+    return h.digest()
+
+
+def snapshot(cachedir):
+    # {(name, arch): (nevra, provides digest, requires digest)}
+    # Digests keep the result small enough to send back from a worker.
+    base = make_base(cachedir, cacheonly=True)
+    try:
+        return {
+            (pkg.name, pkg.arch): (
+                str(pkg),
+                reldeps_digest(pkg.provides),
+                reldeps_digest(pkg.requires),
+            )
+            for pkg in base.sack.query()
+        }
+    finally:
+        base.close()
+
+
+def closures(cachedir, workloads):
+    # {workload name: ({(name, arch): nevra}, problems)}
+    base = make_base(cachedir, cacheonly=True)
+    try:
+        result = {}
+        for name, subjects in workloads.items():
+            pkgs, problems = resolve_closure(base.sack, subjects)
+            result[name] = {(pkg.name, pkg.arch): str(pkg) for pkg in pkgs}, problems
+        return result
+    finally:
+        base.close()
+
+
+def start_snapshots(cachedirs, workloads):
+    # Returns (snapshot futures, closure futures), one of each per cachedir.
+    # Closures are slower, so they're queued behind the snapshots and
+    # the package diff can be shown first.
+    executor = spawn_executor(len(cachedirs))
+    snapshot_futures = [executor.submit(snapshot, c) for c in cachedirs]
+    closure_futures = [executor.submit(closures, c, workloads) for c in cachedirs]
+    executor.shutdown(wait=False)
+    return snapshot_futures, closure_futures
+
+
+def diff_snapshots(old, new):
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    changed = []
+    for key in sorted(old.keys() & new.keys()):
+        old_entry = old[key]
+        new_entry = new[key]
+        if old_entry == new_entry:
+            continue
+        aspects = [
+            name
+            for name, o, n in zip(('version', 'provides', 'requires'), old_entry, new_entry)
+            if o != n
+        ]
+        changed.append((key, old_entry[0], new_entry[0], aspects))
+    return added, removed, changed
+
+
+def diff_closures(old, new):
+    # [(workload name, added keys, removed keys, new problems)] for
+    # workloads whose closure changed or got new resolution problems
+    result = []
+    for name in sorted(old.keys() & new.keys()):
+        (old_keys, old_problems), (new_keys, new_problems) = old[name], new[name]
+        added = sorted(new_keys.keys() - old_keys.keys())
+        removed = sorted(old_keys.keys() - new_keys.keys())
+        problems = [p for p in new_problems if p not in old_problems]
+        if added or removed or problems:
+            result.append((name, added, removed, problems))
+    return result
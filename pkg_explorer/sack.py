@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import dnf
+
+from .consts import cachedir as default_cachedir, releasever, the_arch
+
+
+class Progress(dnf.callback.DownloadProgress):
+    def start(self, total_files, total_size, total_drpms=0):
+        print('starting...', total_files, total_size)
+    def progress(self, payload, done):
+        print('progress...', payload, done)
+    def end(self, payload, status, msg):
+        print('end...', payload, status, msg)
+
+
+def make_base(cachedir=default_cachedir, *, cacheonly=False):
+    base = dnf.Base()
+    conf = base.conf
+    conf.cachedir = cachedir
+    conf.cacheonly = cacheonly
+    conf.substitutions['releasever'] = releasever
+    conf.substitutions['basearch'] = the_arch
+    base.repos.add_new_repo('rawhide', conf,
+        baseurl=["http://download.fedoraproject.org/pub/fedora/linux/development/$releasever/Everything/$basearch/os/"])
+    base.repos.add_new_repo('rawhide-source', conf,
+        baseurl=["http://download.fedoraproject.org/pub/fedora/linux/development/$releasever/Everything/source/tree/"])
+    print('Filling sack...', cachedir)
+    base.repos.all().set_progress_bar(Progress())
+    base.fill_sack(load_system_repo=False)
+    print('Done!', cachedir)
+    return base
+
+
+def spawn_executor(max_workers, **kwargs):
+    # Spawn rather than fork: the parent has Qt (and its threads) loaded
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        **kwargs,
+    )
+
+
+def subject_query(sack, text):
+    # Remote sacks (see client.py) resolve subjects on the server
+    if resolve := getattr(sack, 'resolve_subject', None):
+        return resolve(text)
+    return dnf.subject.Subject(text).get_best_query(sack)
+
+
+# The sack queries model items make. They're cached in QueryCache, which
+# the prefetcher (see prefetch.py) can fill ahead of time.
+
+def subject_packages(sack, text):
+    return list(subject_query(sack, text))
+
+
+def what_provides(sack, reldep):
+    q = sack.query().available()
+    return list(q.filter(provides=reldep, arch=[the_arch, 'noarch']))
+
+
+def what_requires(sack, reldep):
+    q = sack.query().available()
+    return list(q.filter(requires=reldep, arch=[the_arch, 'noarch', 'src']))
+
+
+class SourceIndex:
+    # Source packages and the binaries built from them, by source name.
+    # Built with a single pass over the sack.
+
+    def __init__(self, sack):
+        self.sources = {}
+        self.binaries = {}
+        for pkg in sack.query():
+            if pkg.arch == 'src':
+                self.sources.setdefault(pkg.name, []).append(pkg)
+            elif pkg.source_name:
+                by_arch = self.binaries.setdefault(pkg.source_name, {})
+                by_arch.setdefault(pkg.arch, []).append(pkg)
+
+    def binaries_of(self, source_name, arches=(the_arch, 'noarch')):
+        by_arch = self.binaries.get(source_name, {})
+        return [pkg for arch in arches for pkg in by_arch.get(arch, ())]
+
+
+class QueryCache:
+    # Query results, least recently used first. With a budget (a number
+    # of packages), the oldest results are dropped when it's exceeded.
+
+    def __init__(self, sack, budget=None):
+        self.sack = sack
+        self.budget = budget
+        self.size = 0
+        self.results = OrderedDict()
+
+    def get(self, func, arg):
+        key = func.__name__, str(arg)
+        try:
+            result = self.results[key]
+        except KeyError:
+            result = func(self.sack, arg)
+            self._add(key, result)
+        else:
+            self.results.move_to_end(key)
+        return result
+
+    def peek(self, func, arg):
+        return self.results.get((func.__name__, str(arg)))
+
+    def put(self, func_name, arg, pkgs):
+        if (func_name, arg) not in self.results:
+            self._add((func_name, arg), pkgs)
+
+    def _add(self, key, result):
+        self.results[key] = result
+        self.size += len(result) + 1
+        while self.budget and self.size > self.budget and len(self.results) > 1:
+            old_key, old = self.results.popitem(last=False)
+            self.size -= len(old) + 1
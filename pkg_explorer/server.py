@@ -0,0 +1,186 @@
+import asyncio
+import argparse
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .consts import cachedir, server_socket, server_cache_size
+from .configs import read_yaml, workload_packages
+from .closure import resolve_closure
+from .sack import make_base, subject_query
+
+package_fields = (
+    'name', 'epoch', 'version', 'release', 'arch', 'source_name',
+    'reponame', 'installsize', 'downloadsize',
+)
+dep_fields = ('requires', 'provides', 'recommends', 'suggests')
+
+
+def package_record(pkg):
+    record = {'nevra': str(pkg)}
+    for field in package_fields:
+        record[field] = getattr(pkg, field)
+    return record
+
+
+class QueryHandler:
+    # Answers queries against one loaded sack, caching the most recently
+    # used results. Not thread-safe: the server calls it from a single
+    # worker thread.
+
+    def __init__(self, base, root_path, cache_size=server_cache_size):
+        self.base = base
+        self.root_path = root_path
+        self.packages = {}
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def handle(self, method, params):
+        key = method, json.dumps(params, sort_keys=True)
+        if method == 'workload':
+            # so edited configs are read again
+            key += (self.root_path / params['name']).stat().st_mtime_ns,
+        try:
+            result = self.cache[key]
+        except KeyError:
+            self.misses += 1
+            try:
+                handler = getattr(self, 'do_' + method)
+            except AttributeError:
+                raise LookupError(f'unknown method: {method}')
+            result = self.cache[key] = handler(**params)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        return result
+
+    def _records(self, q):
+        result = []
+        for pkg in q:
+            record = package_record(pkg)
+            self.packages[record['nevra']] = pkg
+            result.append(record)
+        return result
+
+    def _package(self, nevra):
+        if nevra not in self.packages:
+            self._records(self.base.sack.query())
+        return self.packages[nevra]
+
+    def do_query(self, steps):
+        # steps: list of ["available"] or ["filter", {kwargs}]
+        q = self.base.sack.query()
+        for step in steps:
+            if step[0] == 'available':
+                q = q.available()
+            elif step[0] == 'filter':
+                q = q.filter(**step[1])
+            else:
+                raise ValueError(f'unknown query step: {step[0]}')
+        return self._records(q)
+
+    def do_subject(self, text):
+        return self._records(subject_query(self.base.sack, text))
+
+    def do_deps(self, nevra):
+        pkg = self._package(nevra)
+        return {
+            field: [str(r) for r in getattr(pkg, field)]
+            for field in dep_fields
+        }
+
+    def do_workload(self, name):
+        data = read_yaml(self.root_path / name).get('data', {})
+        return {
+            text: self.do_subject(text)
+            for text in workload_packages(data)
+        }
+
+    def do_names(self):
+        return sorted({pkg.name for pkg in self.base.sack.query().available()})
+
+    def do_closure(self, subjects):
+        pkgs, problems = resolve_closure(self.base.sack, subjects)
+        return {'packages': self._records(pkgs), 'problems': problems}
+
+    def do_stats(self):
+        return {
+            'cached': len(self.cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'packages': len(self.packages),
+        }
+
+
+class QueryServer:
+    # JSON Lines over a Unix socket.
+    # Request: {"id": ..., "method": ..., "params": {...}}
+    # Response: {"id": ..., "result": ...} or {"id": ..., "error": "..."}
+
+    def __init__(self, handler, path=server_socket):
+        self.handler = handler
+        self.path = path
+        # hawkey isn't thread-safe; one worker keeps the event loop free
+        # for I/O while queries run one at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(
+            self.handle_client, self.path, limit=2**24,
+        )
+        print('Listening on', self.path)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                response = {'id': None}
+                try:
+                    request = json.loads(line)
+                    response['id'] = request.get('id')
+                    # stats are answered directly so they're not cached
+                    if request['method'] == 'stats':
+                        response['result'] = self.handler.do_stats()
+                    else:
+                        response['result'] = await loop.run_in_executor(
+                            self.executor, self.handler.handle,
+                            request['method'], request.get('params', {}),
+                        )
+                except Exception as e:
+                    response['error'] = f'{type(e).__name__}: {e}'
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='pkg_explorer.server')
+    parser.add_argument('--socket', default=server_socket)
+    parser.add_argument('--cachedir', default=cachedir)
+    parser.add_argument(
+        '--configs', type=Path, default=Path('content-resolver-input/configs'),
+    )
+    args = parser.parse_args()
+    base = make_base(args.cachedir)
+    try:
+        server = QueryServer(QueryHandler(base, args.configs), args.socket)
+        asyncio.run(server.serve_forever())
+    finally:
+        base.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from functools import partial
+
+from PySide2.QtCore import QEventLoop
+from PySide2.QtWidgets import QApplication, QTreeView
+
+trace_version = 1
+
+
+class TraceRecorder:
+    # Writes a JSON Lines trace: a header with the starting state,
+    # then one line per model operation or view expansion
+
+    def __init__(self, path, model, subjects):
+        self.model = model
+        self.file = open(path, 'w')
+        self.start = time.perf_counter()
+        self._write({
+            'version': trace_version,
+            'color_engine': model.color_engine,
+            'mods': [
+                [key, mod.color.name if mod.color else None]
+                for key, mod in model.mods_root.mods.items()
+            ],
+            'subjects': subjects,
+        })
+
+    def _write(self, entry):
+        print(json.dumps(entry), file=self.file, flush=True)
+
+    def record(self, op, **args):
+        self._write({
+            't': round(time.perf_counter() - self.start, 4),
+            'op': op,
+            **args,
+        })
+
+    def watch(self, view):
+        view.expanded.connect(partial(self._view_event, view, 'expand'))
+        view.collapsed.connect(partial(self._view_event, view, 'collapse'))
+
+    def _view_event(self, view, op, index):
+        path = self.model.item_path(index.internalPointer())
+        self.record(op, view=view.objectName(), path=path)
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get('version') != trace_version:
+            raise ValueError(f'{path}: unsupported trace version')
+        return header, [json.loads(line) for line in f if line.strip()]
+
+
+def wait_for_coloring(app, model, timeout):
+    deadline = time.perf_counter() + timeout
+    app.processEvents()
+    while model.coloring_active:
+        if time.perf_counter() > deadline:
+            raise TimeoutError('coloring did not finish')
+        app.processEvents(QEventLoop.AllEvents, 50)
+
+
+def apply_step(window, model, step):
+    from .coloring import Color
+
+    op = step['op']
+    if op == 'set_active':
+        model.set_active(model.item_at_path(step['path']))
+    elif op == 'set_color':
+        index = model._index_for_item(model.item_at_path(step['path']))
+        color = Color[step['color']] if step['color'] else None
+        model.set_color(index, color)
+    elif op == 'add_subject':
+        model.add_subject(step['text'])
+    elif op == 'expand_reqs':
+        model.set_expand_reqs(step['value'])
+    elif op == 'expand_provides':
+        model.set_expand_provides(step['value'])
+    elif op == 'group_by_source':
+        model.set_group_by_source(step['value'])
+    elif op in ('expand', 'collapse'):
+        view = window.findChild(QTreeView, step['view'])
+        index = model._index_for_item(model.item_at_path(step['path']))
+        if op == 'expand':
+            view.expand(index)
+        else:
+            view.collapse(index)
+    else:
+        raise ValueError(f'unknown trace op: {op}')
+
+
+def replay(trace_path, timeout=600):
+    # Replays a trace headlessly against the local dnf cache.
+    # For each step, "latency" is the time until the operation and the
+    # events it posted are processed; "settled" also includes waiting
+    # for coloring to finish. Footprints are turned off, so their
+    # closures don't get resolved in the middle of steps.
+    from .ui import get_main
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    header, steps = read_trace(trace_path)
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    with tempfile.TemporaryDirectory() as tmp:
+        mods_path = Path(tmp, 'mods.txt')
+        with mods_path.open('w') as f:
+            for (kind, name), color in header['mods']:
+                print(color, kind, name, file=f)
+        add_path = Path(tmp, 'add.txt')
+        add_path.write_text(''.join(f'{s}\n' for s in header['subjects']))
+
+        start = time.perf_counter()
+        window, model = get_main(
+            add_path=add_path, mods_path=mods_path, cacheonly=True,
+            color_engine=header['color_engine'], footprints=False,
+        )
+        with model:
+            window.show()
+            wait_for_coloring(app, model, timeout)
+            results = [{'op': 'startup', 'latency': time.perf_counter() - start}]
+            results[0]['settled'] = results[0]['latency']
+            for step in steps:
+                step_start = time.perf_counter()
+                apply_step(window, model, step)
+                app.processEvents()
+                latency = time.perf_counter() - step_start
+                wait_for_coloring(app, model, timeout)
+                results.append({
+                    'op': step['op'],
+                    'path': step.get('path'),
+                    'latency': latency,
+                    'settled': time.perf_counter() - step_start,
+                })
+            total = time.perf_counter() - start
+            window.close()
+    return {'trace': str(trace_path), 'total': total, 'steps': results}
+
+
+def print_report(report, out=sys.stdout):
+    print(f'{report["trace"]}: {report["total"]:.2f}s total', file=out)
+    for step in report['steps']:
+        where = ''
+        if step.get('path'):
+            where = ' / '.join(label for row, label in step['path'][1:])
+        print(
+            f'  {step["latency"] * 1000:9.1f} ms {step["settled"] * 1000:9.1f} ms'
+            f'  {step["op"]} {where}',
+            file=out,
+        )
+
+
+def compare(report, baseline, tolerance):
+    # Returns descriptions of steps that got slower than allowed
+    regressions = []
+    pairs = [('total', report['total'], baseline['total'])]
+    for i, (step, base_step) in enumerate(zip(report['steps'], baseline['steps'])):
+        pairs.append((f'step {i} ({step["op"]})', step['settled'], base_step['settled']))
+    for name, value, base_value in pairs:
+        if value > base_value * (1 + tolerance):
+            regressions.append(f'{name}: {value:.3f}s, was {base_value:.3f}s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='pkg_explorer.tracing')
+    parser.add_argument('traces', nargs='+', type=Path)
+    parser.add_argument('--json', type=Path, metavar='FILE',
+                        help='save reports (one per trace) as JSON')
+    parser.add_argument('--baseline', type=Path, metavar='FILE',
+                        help='compare with reports saved by --json')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against the baseline (default: 0.25)')
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    reports = []
+    for trace in args.traces:
+        report = replay(trace, args.timeout)
+        print_report(report)
+        reports.append(report)
+    if args.json:
+        with args.json.open('w') as f:
+            json.dump(reports, f, indent=2)
+    if args.baseline:
+        with args.baseline.open() as f:
+            baselines = {b['trace']: b for b in json.load(f)}
+        failed = False
+        for report in reports:
+            if baseline := baselines.get(report['trace']):
+                for regression in compare(report, baseline, args.tolerance):
+                    print(f'{report["trace"]}: regression: {regression}')
+                    failed = True
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
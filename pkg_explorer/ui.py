@@ -1,9 +1,11 @@
 import sys
 import os
+import argparse
+import multiprocessing
 from contextlib import contextmanager
 import enum
 from pathlib import Path
-from functools import partial
+from functools import partial, cached_property
 import pickle
 
 from PySide2.QtCore import QAbstractItemModel, Qt, QModelIndex, QTimer, QSize
@@ -11,32 +13,33 @@ from PySide2.QtCore import QPoint, QRect
 from PySide2.QtWidgets import QApplication, QWidget, QAction, QStyle, QMenu
 from PySide2.QtWidgets import QStyledItemDelegate, QInputDialog
 from PySide2.QtUiTools import QUiLoader
-from PySide2.QtGui import QFontMetrics, QCursor
+from PySide2.QtGui import QFontMetrics, QCursor, QBrush
 
-import dnf
-
-from .modelitems import Workload, ResolverInput, Labels, Label, Mods, Mod
-from .modelitems import Workset, Subject
+from .modelitems import Workload, ResolverInput, Labels, Label, Mods
+from .modelitems import Workset, Subject, RepoDiff
+from .modelitems import Package, Requirement, Provide
 from .modelitems import AutoexpandRole, ColorRole
-from .consts import cachedir, releasever, the_arch
-from .coloring import colorize, Color
+from .consts import cachedir, node_cache_budget, server_socket, fetch_page_size
+from .configs import read_mods, workload_subjects
+from .repodiff import start_snapshots
+from .sack import make_base, QueryCache, SourceIndex, what_provides, what_requires
+from .sack import subject_packages
+from .prefetch import prefetch_worker, package_queries
+from .client import RemoteBase
+from .cache import NodeCache
+from .closure import start_resolver, resolve_nevras
+from .footprint import Footprint
+from .coloring import colorize, colorize_bitsets, PackageIndex, Color
 from .util import get_icon
-
-
-class Progress(dnf.callback.DownloadProgress):
-    def start(self, total_files, total_size, total_drpms=0):
-        print('starting...', total_files, total_size)
-    def progress(self, payload, done):
-        print('progress...', payload, done)
-    def end(self, payload, status, msg):
-        print('end...', payload, status, msg)
+from .tracing import TraceRecorder
 
 
 class CoroDriver:
-    def __init__(self, coro, model):
+    def __init__(self, coro, model, colors_changed=True):
         self.active = True
         self.coro = coro
         self.model = model
+        self.colors_changed = colors_changed
         self.drive()
 
     def drive(self):
@@ -50,36 +53,146 @@ class CoroDriver:
             else:
                 QTimer.singleShot(1, self.drive)
                 return
+            self.model._coloring_done(self.colors_changed)
         self.coro.close()
         self.active = False
 
 
+class Prefetcher:
+    # Resolves children of visible rows and auto-expand candidates
+    # in a worker process, and fills the model's query cache with the
+    # results. Scrolling or expanding replaces the worker's to-do list.
+
+    def __init__(self, model):
+        self.model = model
+        self.views = []
+        self.generation = 0
+        ctx = multiprocessing.get_context('spawn')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=prefetch_worker, daemon=True,
+            args=(child_conn, cachedir, model.queries.budget),
+        )
+        self.process.start()
+        child_conn.close()
+
+        self.update_timer = QTimer()
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(50)
+        self.update_timer.timeout.connect(self.update)
+        self.poll_timer = QTimer()
+        self.poll_timer.setInterval(20)
+        self.poll_timer.timeout.connect(self.poll)
+        self.poll_timer.start()
+        # Signal arguments must not reach QTimer.start(msec)
+        model.qt_model.layoutChanged.connect(self.schedule_update)
+
+    def schedule_update(self, *args):
+        self.update_timer.start()
+
+    def watch(self, view):
+        self.views.append(view)
+        view.verticalScrollBar().valueChanged.connect(self.schedule_update)
+        view.expanded.connect(self.schedule_update)
+        view.collapsed.connect(self.schedule_update)
+        self.update_timer.start()
+
+    def _visible_indexes(self, view):
+        height = view.viewport().height()
+        index = view.indexAt(QPoint(0, 0))
+        while index.isValid() and view.visualRect(index).top() < height:
+            yield index
+            index = view.indexBelow(index)
+
+    def _have(self, pkg):
+        # Whether expanding pkg would only hit the query cache. Results
+        # can be evicted, so this is asked again on every update.
+        queries = self.model.queries
+        return all(
+            queries.peek(func, arg) is not None
+            for func, arg in package_queries(pkg)
+        )
+
+    def update(self):
+        queries = self.model.queries
+        visible = []
+        candidates = []
+        for view in self.views:
+            if not view.isVisible():
+                continue
+            for index in self._visible_indexes(view):
+                item = index.internalPointer()
+                if isinstance(item, Package):
+                    if not self._have(item.pkg):
+                        visible.append(('pkg', str(item.pkg)))
+                elif isinstance(item, Subject):
+                    pkgs = queries.peek(subject_packages, item.label)
+                    if pkgs is None or not all(map(self._have, pkgs)):
+                        visible.append(('subject', item.label))
+                elif isinstance(item, Requirement):
+                    # A requirement with one package autoexpands into it
+                    if isinstance(item, Provide):
+                        pkgs = queries.peek(what_requires, item.reldep)
+                    else:
+                        pkgs = queries.peek(what_provides, item.reldep)
+                    if pkgs and len(pkgs) == 1 and not self._have(pkgs[0]):
+                        candidates.append(('pkg', str(pkgs[0])))
+        wanted = list(dict.fromkeys(visible + candidates))
+        self.generation += 1
+        self.conn.send((self.generation, wanted))
+
+    def poll(self):
+        queries = self.model.queries
+        while self.conn.poll():
+            generation, kind, arg, results = self.conn.recv()
+            for (func_name, key), nevras in results.items():
+                pkgs = [self.model.package_by_nevra.get(n) for n in nevras]
+                if None in pkgs:
+                    # The worker's sack differs; leave this one to the model
+                    continue
+                queries.put(func_name, key, pkgs)
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.update_timer.stop()
+        self.conn.send(None)
+        self.process.join(1)
+
+
 class PkgModel:
-    def __init__(self, root_path):
+    def __init__(
+        self, root_path, diff_cachedirs=None, color_engine='incremental',
+        node_cache_budget=node_cache_budget, server=None, prefetch=False,
+        mods_path='mods.txt', cacheonly=False, footprints=True,
+    ):
         self.collapse_reqs = True
         self.collapse_provides = True
+        self.group_by_source = False
+        self.mods_path = mods_path
+        self.recorder = None
+
+        self.node_cache = NodeCache(
+            node_cache_budget,
+            on_over_budget=lambda: QTimer.singleShot(0, self.evict_nodes),
+        )
 
         self.qt_model = PkgQtModel(self)
 
-        base = dnf.Base()
-        conf = base.conf
-        conf.cachedir = cachedir
-        conf.substitutions['releasever'] = releasever
-        conf.substitutions['basearch'] = the_arch
-        base.repos.add_new_repo('rawhide', conf,
-            baseurl=["http://download.fedoraproject.org/pub/fedora/linux/development/$releasever/Everything/$basearch/os/"])
-        base.repos.add_new_repo('rawhide-source', conf,
-            baseurl=["http://download.fedoraproject.org/pub/fedora/linux/development/$releasever/Everything/source/tree/"])
-        print('Filling sack...')
-        base.repos.all().set_progress_bar(Progress())
-        base.fill_sack(load_system_repo=False)
-        print('Done!')
-
-        self.base = base
+        if diff_cachedirs:
+            # Started first, so the snapshots load alongside our own sack
+            diff_futures = start_snapshots(diff_cachedirs, workload_subjects(root_path))
+
+        if server:
+            self.base = RemoteBase(server)
+        else:
+            self.base = make_base(cachedir, cacheonly=cacheonly)
+        # Query results count against the same budget as child nodes
+        self.queries = QueryCache(self.base.sack, node_cache_budget)
 
         self.obj_colors = {}
 
         self._color_driver = None
+        self.color_engine = color_engine
 
         self.labels = {}
 
@@ -93,48 +206,127 @@ class PkgModel:
             self.mods_root,
             self.workset_root,
         ]
+        if diff_cachedirs:
+            self.diff_root = RepoDiff(*diff_cachedirs, diff_futures, model=self)
+            self.roots.append(self.diff_root)
+            self._diff_timer = QTimer()
+            self._diff_timer.setInterval(100)
+            self._diff_timer.timeout.connect(self._poll_diff)
+            self._diff_timer.start()
+        else:
+            self.diff_root = None
 
         self.active_indexes = {}
 
+        self.footprint_columns = (
+            ['Installed', 'Download']
+            + [color.title for color in Color]
+            + ['Uncolored']
+        )
+        self.sources_root.col_count = 1 + len(self.footprint_columns)
+        self.show_footprints = footprints
+        self.footprints = {}
+        self.color_generation = 0
+        self._partial_footprints = set()
+        self._server = server
+        self._footprint_jobs = {}
+        self._footprint_timer = QTimer()
+        self._footprint_timer.setInterval(100)
+        self._footprint_timer.timeout.connect(self._poll_footprints)
+
+        if prefetch and not server:
+            self.prefetcher = Prefetcher(self)
+        else:
+            self.prefetcher = None
+
         self.init_mods()
 
     def init_mods(self):
         with self.changing_layout():
-            with open('mods.txt') as f:
-                mods = self.mods_root
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    if line.startswith('#'):
-                        continue
-                    color, kind, name = line.split(' ', 2)
-                    key = kind, name
-                    if color == 'None':
-                        color = None
-                    else:
-                        color = Color[color]
-                    mods.mods[key] = Mod(key, color, parent=mods)
-            self.obj_colors.clear()
+            mods = self.mods_root
+            for key, color in read_mods(self.mods_path).items():
+                if color is not None:
+                    color = Color[color]
+                mods.add(key, color)
         self._recolor()
 
+    def _poll_diff(self):
+        if not self.diff_root.stages:
+            self._diff_timer.stop()
+        elif self.diff_root.ready:
+            with self.changing_layout():
+                self.diff_root.advance()
+
     def __enter__(self):
         pass
 
     def __exit__(self, *err):
+        if self.prefetcher:
+            self.prefetcher.stop()
+        if 'footprint_resolver' in vars(self):
+            self.footprint_resolver.shutdown(wait=False, cancel_futures=True)
         self.base.close()
 
     def get_main_index(self, idx):
         return self.qt_model.createIndex(self.roots.index(idx), 0, idx)
 
+    def _record(self, op, **args):
+        if self.recorder:
+            self.recorder.record(op, **args)
+
+    def item_path(self, item):
+        # [root number, [row, label], [row, label], ...]
+        path = []
+        while item.parent is not None:
+            path.append([item.parent.children.index(item), str(item.label)])
+            item = item.parent
+        path.append(self.roots.index(item))
+        return path[::-1]
+
+    def item_at_path(self, path):
+        root, *steps = path
+        item = self.roots[root]
+        for row, label in steps:
+            children = item.children
+            if row < len(children) and str(children[row].label) == label:
+                item = children[row]
+                continue
+            # Rows moved; look for the label
+            for child in children:
+                if str(child.label) == label:
+                    item = child
+                    break
+            else:
+                raise LookupError(f'{label!r} not found in {item.label!r}')
+        return item
+
+    @property
+    def coloring_active(self):
+        return bool(self._color_driver and self._color_driver.active)
+
     def set_expand_reqs(self, value):
+        self._record('expand_reqs', value=value)
         with self.changing_layout():
             self.collapse_reqs = not value
 
     def set_expand_provides(self, value):
+        self._record('expand_provides', value=value)
         with self.changing_layout():
             self.collapse_provides = not value
 
+    def set_group_by_source(self, value):
+        self._record('group_by_source', value=value)
+        with self.changing_layout():
+            self.group_by_source = value
+
+    @cached_property
+    def source_index(self):
+        return SourceIndex(self.base.sack)
+
+    @cached_property
+    def package_index(self):
+        return PackageIndex(self.source_index)
+
     def ensure_label(self, lbl):
         if lbl not in self.labels:
             self.labels[lbl] = None
@@ -142,23 +334,137 @@ class PkgModel:
                 self.labels[lbl] = Label(lbl, parent=self.labels_root)
                 self._sorted_labels = [v for k, v in sorted(self.labels.items())]
 
-    def _recolor(self):
+    def _recolor(self, colors_changed=True):
+        if self.color_engine == 'bitset':
+            colors = colorize_bitsets(self)
+            with self.changing_layout():
+                self.obj_colors = colors
+            if colors_changed:
+                self._colors_changed()
+            return
+        # Colors are first come, first served, so start from scratch
         if self._color_driver:
+            # An unfinished run still owes its change
+            if self._color_driver.active:
+                colors_changed = colors_changed or self._color_driver.colors_changed
             self._color_driver.active = False
-        else:
-            self._color_driver = CoroDriver(colorize(self), self)
+        with self.changing_layout():
+            self.obj_colors.clear()
+        self._color_driver = CoroDriver(colorize(self), self, colors_changed)
 
-    def _colorize(self, item, new_color):
-        if item.underlying_object not in self.obj_colors:
-            self.obj_colors[item.underlying_object] = new_color
+    def _colorize(self, obj, new_color):
+        if obj not in self.obj_colors:
+            self.obj_colors[obj] = new_color
 
     def set_active_index(self, index):
-        item = index.internalPointer()
+        self.set_active(index.internalPointer())
+
+    def set_active(self, item):
+        self._record('set_active', path=self.item_path(item))
         self.active_indexes[type(item)] = item.underlying_object
-        with self.changing_layout():
-            self.obj_colors.clear()
         self._recolor()
 
+    def _colors_changed(self):
+        # Footprints are re-bucketed lazily, see footprint()
+        self.color_generation += 1
+        self._partial_footprints.clear()
+
+    def _coloring_done(self, colors_changed):
+        if colors_changed:
+            self._colors_changed()
+            return
+        # Footprints bucketed while coloring ran saw partial colors
+        for footprint in self._partial_footprints:
+            footprint.generation = None
+        self._partial_footprints.clear()
+
+    def package_color(self, pkg):
+        if mod := self.mods_root.mods.get(('pkg', pkg.name)):
+            return mod.color
+        return self.obj_colors.get(pkg)
+
+    @cached_property
+    def package_by_nevra(self):
+        return {str(pkg): pkg for pkg in self.base.sack.query()}
+
+    @cached_property
+    def footprint_resolver(self):
+        return start_resolver(cachedir, self._server)
+
+    def footprint(self, workload):
+        # Returns None until the workload's closure is resolved
+        footprint = self.footprints.get(workload)
+        if footprint is None:
+            if workload not in self._footprint_jobs:
+                self._footprint_jobs[workload] = self.footprint_resolver.submit(
+                    resolve_nevras, workload.subjects,
+                )
+                self._footprint_timer.start()
+            return None
+        if footprint.generation != self.color_generation:
+            footprint.recolor(self.package_color)
+            footprint.generation = self.color_generation
+            if self.coloring_active:
+                self._partial_footprints.add(footprint)
+        return footprint
+
+    def _poll_footprints(self):
+        for workload, job in list(self._footprint_jobs.items()):
+            if not job.done():
+                continue
+            del self._footprint_jobs[workload]
+            try:
+                nevras, problems = job.result()
+            except Exception as e:
+                nevras, problems = [], [f'{type(e).__name__}: {e}']
+            pkgs = [self.package_by_nevra.get(nevra) for nevra in nevras]
+            if None in pkgs:
+                problems.append("resolved packages that aren't in the loaded sack")
+                pkgs = [pkg for pkg in pkgs if pkg is not None]
+            if problems:
+                print(workload.path.name, '; '.join(problems))
+            footprint = Footprint(pkgs, self.package_color, problems)
+            footprint.generation = self.color_generation
+            if self.coloring_active:
+                self._partial_footprints.add(footprint)
+            self.footprints[workload] = footprint
+            index = self._index_for_item(workload)
+            if index.isValid():
+                self.qt_model.dataChanged.emit(
+                    index.siblingAtColumn(1),
+                    index.siblingAtColumn(len(self.footprint_columns)),
+                )
+        if not self._footprint_jobs:
+            self._footprint_timer.stop()
+
+    def footprint_data(self, workload, column, role):
+        if not self.show_footprints:
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight | Qt.AlignVCenter
+        colors = list(Color) + [None]
+        if role == Qt.ForegroundRole and column > 2:
+            if color := colors[column - 3]:
+                return QBrush(color.value)
+        if role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        footprint = self.footprint(workload)
+        if footprint is None:
+            return '…'
+        if role == Qt.ToolTipRole:
+            if footprint.problems:
+                return 'Partial closure:\n' + '\n'.join(footprint.problems)
+            return None
+        if column == 1:
+            size = footprint.installsize
+        elif column == 2:
+            size = footprint.downloadsize
+        else:
+            size, download = footprint.get(colors[column - 3])
+        if column == 1 and footprint.problems:
+            return f'{size / 2**20:.1f} MiB ⚠'
+        return f'{size / 2**20:.1f} MiB'
+
     @contextmanager
     def changing_layout(self):
         self.qt_model.layoutAboutToBeChanged.emit()
@@ -168,6 +474,20 @@ class PkgModel:
                 self.qt_model.changePersistentIndex(index, replaced)
         self.qt_model.layoutChanged.emit()
 
+    def _pinned_items(self):
+        # Views keep their expanded indexes as persistent indexes,
+        # so this covers everything that is expanded in any view.
+        pinned = set()
+        for index in self.qt_model.persistentIndexList():
+            item = index.internalPointer()
+            while item is not None and item not in pinned:
+                pinned.add(item)
+                item = item.parent
+        return pinned
+
+    def evict_nodes(self):
+        self.node_cache.evict(self._pinned_items())
+
     def _replaced_index(self, index):
         item = index.internalPointer()
         parent = index.parent()
@@ -179,11 +499,17 @@ class PkgModel:
         if len(p_children) > index.row() and p_children[index.row()] == item:
             # Same position
             return
-        for i, child in enumerate(p_children):
-            if child == item:
-                return self.qt_model.index(i, 0, parent)
-        # Slow path
-        return self._index_for_item(item)
+        try:
+            row = p_children.index(item)
+        except ValueError:
+            # Slow path
+            return self._index_for_item(item)
+        self._ensure_fetched(p_item, row)
+        return self.qt_model.index(row, 0, parent)
+
+    def _ensure_fetched(self, item, row):
+        if item.fetched_rows <= row:
+            item.fetched_rows = row + 1
 
     def _index_for_item(self, item):
         if item is None:
@@ -197,10 +523,15 @@ class PkgModel:
         except ValueError:
             # No longer part of model
             return QModelIndex()
+        self._ensure_fetched(parent, row)
         return self.qt_model.index(row, 0, parent_index)
 
     def set_color(self, index, color):
         item = index.internalPointer()
+        self._record(
+            'set_color', path=self.item_path(item),
+            color=color.name if color else None,
+        )
         key = item.key
         if key != None:
             mods = self.mods_root
@@ -209,18 +540,27 @@ class PkgModel:
                 if mod:
                     mod.color = color
                 else:
-                    mods.mods[key] = Mod(key, color, parent=mods)
-            with open('mods.txt', 'w') as f:
+                    mods.add(key, color)
+            with open(self.mods_path, 'w') as f:
                 for (kind, name), item in mods.mods.items():
                     if item.color:
                         print(item.color.name, kind, name, file=f)
+            if key[0] == 'pkg':
+                # Package mods don't affect other colors in a closure,
+                # so footprints can be updated in place
+                for footprint in self.footprints.values():
+                    footprint.update_name(key[1], self.package_color)
+                self._recolor(colors_changed=False)
+                return
         self._recolor()
 
     def add_subject(self, text):
+        self._record('add_subject', text=text)
         with self.changing_layout():
             ws = self.workset_root
             item = Subject(text, parent=ws)
             ws.children.append(item)
+            self._ensure_fetched(ws, len(ws.children) - 1)
             return self.qt_model.index(
                 len(ws.children) - 1, 0, self.get_main_index(ws),
             )
@@ -241,17 +581,40 @@ class PkgQtModel(QAbstractItemModel):
         if not index.isValid():
             return None
         item = index.internalPointer()
+        if index.column():
+            return item.column_data(index.column(), role)
         return item.data(role)
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         if role == Qt.DisplayRole:
-            return 'Name'
+            if section == 0:
+                return 'Name'
+            if section <= len(self._mod.footprint_columns):
+                return self._mod.footprint_columns[section - 1]
 
     def rowCount(self, parent):
         if not parent.isValid():
             return 1
+        if parent.column():
+            return 0
         item = parent.internalPointer()
-        return item.row_count
+        return min(item.row_count, item.fetched_rows)
+
+    def canFetchMore(self, parent):
+        if not parent.isValid() or parent.column():
+            return False
+        item = parent.internalPointer()
+        return item.row_count > item.fetched_rows
+
+    def fetchMore(self, parent):
+        item = parent.internalPointer()
+        start = item.fetched_rows
+        count = min(item.row_count - start, fetch_page_size)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, start, start + count - 1)
+        item.fetched_rows = start + count
+        self.endInsertRows()
 
     def columnCount(self, parent):
         if not parent.isValid():
@@ -263,7 +626,7 @@ class PkgQtModel(QAbstractItemModel):
         if not parent.isValid():
             return QModelIndex()
         item = parent.internalPointer()
-        if item.row_count <= row or item.col_count <= column:
+        if self.rowCount(parent) <= row or item.col_count <= column:
             return QModelIndex()
         child = item.get_child(row, column)
         return self.createIndex(row, column, child)
@@ -271,6 +634,8 @@ class PkgQtModel(QAbstractItemModel):
     def hasChildren(self, parent):
         if not parent.isValid():
             return QModelIndex()
+        if parent.column():
+            return False
         item = parent.internalPointer()
         return bool(item.has_children)
 
@@ -350,15 +715,23 @@ def setup_treeview(view, index):
 
     view.header().resizeSection(0, 100);
 
-def get_main():
+def get_main(add_path='add.txt', record=None, **model_args):
     window = QUiLoader().load(str(Path(__file__).parent / 'main.ui'))
     wf = WidgetFinder(window)
 
-    pkg_model = PkgModel(Path('content-resolver-input/configs'))
+    pkg_model = PkgModel(Path('content-resolver-input/configs'), **model_args)
     setup_treeview(wf.tvMainView, pkg_model.get_main_index(pkg_model.workset_root))
     setup_treeview(wf.tvSources, pkg_model.get_main_index(pkg_model.sources_root))
+    wf.tvSources.setHeaderHidden(False)
     setup_treeview(wf.tvLabels, pkg_model.get_main_index(pkg_model.labels_root))
     setup_treeview(wf.tvMods, pkg_model.get_main_index(pkg_model.mods_root))
+    if pkg_model.prefetcher:
+        pkg_model.prefetcher.watch(wf.tvMainView)
+        pkg_model.prefetcher.watch(wf.tvSources)
+    if pkg_model.diff_root:
+        setup_treeview(wf.tvDiff, pkg_model.get_main_index(pkg_model.diff_root))
+    else:
+        wf.dockDiff.hide()
 
     def set_main_workload(index):
         item = index.internalPointer()
@@ -385,23 +758,82 @@ def get_main():
             index = pkg_model.add_subject(text)
             wf.tvMainView.expand(index)
 
+    act.actGroupBySource.setIcon(get_icon('wrench'))
+    act.actGroupBySource.toggled.connect(pkg_model.set_group_by_source)
+
     act.actAddPkg.triggered.connect(add_pkg)
 
-    with open('add.txt') as f:
+    subjects = []
+    with open(add_path) as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
             if line.startswith('#'):
                 continue
-            pkg_model.add_subject(line)
+            subjects.append(line)
+    for subject in subjects:
+        pkg_model.add_subject(subject)
+
+    if record:
+        pkg_model.recorder = TraceRecorder(record, pkg_model, subjects)
+        for view in wf.tvMainView, wf.tvSources, wf.tvLabels, wf.tvMods:
+            pkg_model.recorder.watch(view)
 
     return window, pkg_model
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='pkg_explorer')
+    parser.add_argument(
+        '--diff', metavar='OLD_CACHEDIR',
+        help='show differences between an older dnf cache and the current one',
+    )
+    parser.add_argument(
+        '--diff-to', metavar='NEW_CACHEDIR', default=cachedir,
+        help=f'dnf cache to compare against (default: {cachedir})',
+    )
+    parser.add_argument(
+        '--color-engine', choices=['incremental', 'bitset'], default='incremental',
+        help='incremental colors a few items at a time; bitset colors everything at once',
+    )
+    parser.add_argument(
+        '--node-cache-budget', metavar='NODES', type=int, default=node_cache_budget,
+        help=f'max. number of cached child nodes and query results; 0 for no limit (default: {node_cache_budget})',
+    )
+    parser.add_argument(
+        '--server', metavar='SOCKET', nargs='?', const=server_socket,
+        help=f'use a running pkg_explorer.server instead of loading the sack (default socket: {server_socket})',
+    )
+    parser.add_argument(
+        '--no-prefetch', dest='prefetch', action='store_false',
+        help="don't resolve children of visible rows in the background",
+    )
+    parser.add_argument(
+        '--record', metavar='TRACE',
+        help='record model operations and expansions for pkg_explorer.tracing',
+    )
+    args, rest = parser.parse_known_args(argv[1:])
+    return args, argv[:1] + rest
+
 def main():
     print('pid', os.getpid())
-    app = QApplication(sys.argv)
-    window, model = get_main()
+    args, argv = parse_args(sys.argv)
+    app = QApplication(argv)
+    if args.diff:
+        diff_cachedirs = args.diff, args.diff_to
+    else:
+        diff_cachedirs = None
+    window, model = get_main(
+        diff_cachedirs=diff_cachedirs,
+        color_engine=args.color_engine,
+        node_cache_budget=args.node_cache_budget,
+        server=args.server,
+        prefetch=args.prefetch,
+        record=args.record,
+    )
     window.show()
     with model:
-        sys.exit(app.exec_())
+        status = app.exec_()
+        if model.recorder:
+            model.recorder.close()
+        sys.exit(status)
@@ -0,0 +1,150 @@
+from functools import cached_property
+
+import pytest
+import yaml
+
+pytest.importorskip('PySide2')
+pytest.importorskip('dnf')
+
+from pkg_explorer.cache import NodeCache
+from pkg_explorer.coloring import Color, colorize, colorize_bitsets, PackageIndex
+from pkg_explorer.modelitems import Labels, ResolverInput, Mods, Label
+from pkg_explorer.sack import QueryCache, SourceIndex
+
+
+class FakePackage:
+    def __init__(self, name, arch='x86_64', source_name=None):
+        self.name = name
+        self.arch = arch
+        self.source_name = source_name
+
+    def __repr__(self):
+        return f'<{self.name}.{self.arch}>'
+
+
+class FakeSack:
+    def __init__(self, pkgs, subjects):
+        self.pkgs = pkgs
+        self.subjects = subjects
+
+    def query(self):
+        return self.pkgs
+
+    def resolve_subject(self, text):
+        return self.subjects.get(text, [])
+
+
+class FakeModel:
+    group_by_source = False
+
+    def __init__(self, root_path, sack, mods=()):
+        self.node_cache = NodeCache()
+        self.queries = QueryCache(sack)
+        self.source_index = SourceIndex(sack)
+        self.obj_colors = {}
+        self.active_indexes = {}
+        self.labels = {}
+        self.labels_root = Labels(model=self)
+        self.mods_root = Mods(model=self)
+        for key, color in mods:
+            self.mods_root.add(key, color)
+        self.sources_root = ResolverInput(root_path, model=self)
+
+    def ensure_label(self, lbl):
+        if lbl not in self.labels:
+            self.labels[lbl] = None
+            self.labels[lbl] = Label(lbl, parent=self.labels_root)
+            self._sorted_labels = [v for k, v in sorted(self.labels.items())]
+
+    def package_color(self, pkg):
+        if mod := self.mods_root.mods.get(('pkg', pkg.name)):
+            return mod.color
+        return self.obj_colors.get(pkg)
+
+    @cached_property
+    def package_index(self):
+        return PackageIndex(self.source_index)
+
+
+def write_config(root_path, name, **data):
+    (root_path / name).write_text(yaml.safe_dump({
+        'document': 'feedback-pipeline-workload',
+        'data': data,
+    }))
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    # read_yaml caches into the current directory
+    monkeypatch.chdir(tmp_path)
+    root_path = tmp_path / 'configs'
+    root_path.mkdir()
+
+    def pkg(name, source_name):
+        return FakePackage(name, source_name=source_name)
+
+    bash, sh = pkg('bash', 'bash'), pkg('sh', 'bash')
+    python3, libs = pkg('python3', 'python3'), pkg('python3-libs', 'python3')
+    glibc, common = pkg('glibc', 'glibc'), pkg('glibc-common', 'glibc')
+    vim = pkg('vim', 'vim')
+    srcs = [FakePackage(name, 'src') for name in ('bash', 'python3', 'glibc', 'vim')]
+    sack = FakeSack(
+        [bash, sh, python3, libs, glibc, common, vim] + srcs,
+        {
+            'bash': [bash, sh],
+            'python3': [python3, libs],
+            # glibc-common comes first, and it's colored by a mod
+            'glibc': [common, glibc],
+            'vim': [vim],
+        },
+    )
+    write_config(root_path, 'python.yaml', labels=['eln'], packages=['python3', 'glibc'])
+    write_config(root_path, 'shell.yaml', labels=['eln', 'c9s'], packages=['bash', 'glibc'],
+                 unwanted_packages=['vim'])
+    write_config(root_path, 'editor.yaml', labels=['c9s'], packages=['vim', 'bash'])
+    write_config(root_path, 'empty.yaml', labels=['eln'])
+    return FakeModel(root_path, sack, mods=[
+        (('pkg', 'glibc-common'), Color.RED),
+        (('pkg', 'sh'), None),
+    ])
+
+
+def incremental_colors(model):
+    model.obj_colors = {}
+    for obj, color in colorize(model):
+        model.obj_colors.setdefault(obj, color)
+    return model.obj_colors
+
+
+@pytest.mark.parametrize('active', [
+    None,
+    ('label', 'eln'),
+    ('label', 'c9s'),
+    ('workload', 'shell.yaml'),
+])
+def test_bitset_engine_matches_incremental(model, active):
+    if active:
+        kind, name = active
+        if kind == 'label':
+            model.active_indexes[Label] = model.labels[name].underlying_object
+        else:
+            [wl] = [wl for wl in model.sources_root.children if wl.path.name == name]
+            model.active_indexes[type(wl)] = wl.underlying_object
+            model.active_indexes[Label] = model.labels['eln'].underlying_object
+
+    expected = incremental_colors(model)
+    colors = colorize_bitsets(model)
+
+    assert expected
+    for obj in set(expected) | set(model.queries.sack.pkgs):
+        assert colors.get(obj) == expected.get(obj), obj
+
+
+def test_colors_dont_depend_on_grouping(model):
+    model.active_indexes[Label] = model.labels['eln'].underlying_object
+    expected = incremental_colors(model)
+    model.group_by_source = True
+    assert incremental_colors(model) == expected
+    colors = colorize_bitsets(model)
+    for obj in expected:
+        assert colors.get(obj) == expected[obj], obj
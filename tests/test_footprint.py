@@ -0,0 +1,33 @@
+from pkg_explorer.footprint import Footprint
+
+
+class FakePackage:
+    def __init__(self, name, arch, installsize, downloadsize):
+        self.name = name
+        self.arch = arch
+        self.installsize = installsize
+        self.downloadsize = downloadsize
+
+
+def test_update_name_matches_recolor():
+    pkgs = [
+        FakePackage('bash', 'x86_64', 100, 10),
+        FakePackage('glibc', 'x86_64', 1000, 100),
+        FakePackage('glibc', 'i686', 900, 90),
+        FakePackage('tzdata', 'noarch', 50, 5),
+    ]
+    colors = {'bash': 'red', 'glibc': 'red'}
+
+    def color_of(pkg):
+        return colors.get(pkg.name)
+
+    footprint = Footprint(pkgs, color_of)
+    assert footprint.get('red') == (2000, 200)
+    assert footprint.get(None) == (50, 5)
+
+    for name, color in ('glibc', 'blue'), ('tzdata', 'blue'), ('bash', None), ('glibc', None):
+        colors[name] = color
+        footprint.update_name(name, color_of)
+        expected = Footprint(pkgs, color_of)
+        for c in 'red', 'blue', None:
+            assert footprint.get(c) == expected.get(c), (name, c)
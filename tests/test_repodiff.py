@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip('PySide2')
+pytest.importorskip('dnf')
+
+from pkg_explorer.cache import NodeCache
+from pkg_explorer.modelitems import Workset, DiffGroup, DiffPackage, Package
+from pkg_explorer.sack import QueryCache, SourceIndex
+
+
+class FakePackage:
+    epoch = 0
+    version = '1.0'
+    release = '1'
+    recommends = ()
+    suggests = ()
+
+    def __init__(self, name, arch='x86_64', source_name=None, requires=(), provides=()):
+        self.name = name
+        self.arch = arch
+        self.source_name = source_name
+        self.requires = list(requires)
+        self.provides = list(provides)
+
+    def __str__(self):
+        return f'{self.name}-{self.version}-{self.release}.{self.arch}'
+
+
+class FakeQuery(list):
+    def available(self):
+        return self
+
+    def filter(self, provides=None, requires=None, arch=()):
+        return FakeQuery(
+            pkg for pkg in self
+            if pkg.arch in arch
+            and (provides is None or provides in pkg.provides)
+            and (requires is None or requires in pkg.requires)
+        )
+
+
+class FakeSack:
+    def __init__(self, pkgs):
+        self.pkgs = pkgs
+
+    def query(self):
+        return FakeQuery(self.pkgs)
+
+
+class FakeModel:
+    collapse_reqs = True
+    collapse_provides = True
+    group_by_source = False
+
+    def __init__(self, sack):
+        self.node_cache = NodeCache()
+        self.queries = QueryCache(sack)
+        self.source_index = SourceIndex(sack)
+
+
+def test_diff_package_expands():
+    glibc = FakePackage('glibc', source_name='glibc', provides=['libc.so.6'])
+    bash = FakePackage(
+        'bash', source_name='bash', requires=['libc.so.6'], provides=['/bin/sh'],
+    )
+    src = FakePackage('bash', arch='src')
+    model = FakeModel(FakeSack([glibc, bash, src]))
+
+    group = DiffGroup('Added', 'plus', [(bash, str(bash), 'new')], parent=Workset(model=model))
+    [item] = group.children
+    assert isinstance(item, DiffPackage)
+    assert item.extended_label.endswith('← new')
+
+    assert item.has_children
+    children = list(item.children)
+    assert [child.label for child in children] == ['bash', 'glibc']
+    assert all(isinstance(child, Package) for child in children)
+    for child in children:
+        child.has_children
+        list(child.children)